@@ -0,0 +1,452 @@
+'''
+Benchmarks for the Account class in solutions.py.
+
+Run all benchmarks:
+
+    python account_bench.py
+
+or a single one by name:
+
+    python account_bench.py ledger_memory
+'''
+import asyncio
+import csv
+import os
+import random
+import tempfile
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from fractions import Fraction
+
+from account_book import AccountBook
+from account_metrics import Instrumentation
+from account_profile import make_accounts, make_plan, run as run_plan
+from account_replay import replay
+from account_service import AccountService
+from ledger_io import read_columns, read_csv, write_columns, write_csv
+from solutions import (
+    Account, BatchClock, CoarseClock, ColumnarLedger, FrozenClock, LedgerEntry, Money,
+    OverdraftNotAllowed, get_currency, settle, transfer
+)
+
+
+def _measure(build):
+    '''Return (result, bytes allocated) for calling build().'''
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+def _measure_peak(run):
+    '''Return (seconds, peak bytes allocated) for calling run(); timed in a
+    separate run, since tracing allocations slows everything down.'''
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_ledger_memory(n=100_000):
+    '''Memory per ledger entry: list of LedgerEntry vs ColumnarLedger.'''
+    print(f'ledger_memory: {n:,} entries')
+    for label, currency, make_storage in (
+        ('list of entries', 'USD', list),
+        ('columnar (USD)', 'USD', ColumnarLedger),
+        ('columnar (JPY)', 'JPY', lambda: ColumnarLedger('JPY')),
+    ):
+        def build():
+            acct = Account('f', 'l', '1', ledger_storage=make_storage(), currency=currency)
+            for i in range(n):
+                acct.deposit(i % 997 + 1)
+            return acct
+        _, nbytes = _measure(build)
+        print(f'  {label:<22} {nbytes / n:8.1f} bytes/entry')
+
+
+class _DictAccount:
+    '''An Account's attributes held in an instance __dict__ instead of slots.'''
+    def __init__(self, *args, **kwargs):
+        account = Account(*args, **kwargs)
+        for name in Account.__slots__:
+            setattr(self, name, getattr(account, name))
+
+
+def bench_slots_memory(n=100_000):
+    '''Bytes per account and per ledger entry, before and after __slots__.'''
+    print(f'slots_memory: {n:,} accounts / entries')
+    for label, make in (
+        ('dict account', lambda i: _DictAccount('f', 'l', str(i))),
+        ('slotted account', lambda i: Account('f', 'l', str(i))),
+    ):
+        _, nbytes = _measure(lambda: [make(i) for i in range(n)])
+        print(f'  {label:<22} {nbytes / n:8.1f} bytes/account')
+
+    clock = CoarseClock()
+    usd = get_currency('USD')
+    for label, make in (
+        ('tuple (datetime)', lambda i: (datetime.now(timezone.utc), i, i)),
+        ('tuple (ns)', lambda i: (clock.now(), i, i)),
+        ('LedgerEntry', lambda i: LedgerEntry(clock.now(), i, i, usd)),
+    ):
+        _, nbytes = _measure(lambda: [make(i) for i in range(n)])
+        print(f'  {label:<22} {nbytes / n:8.1f} bytes/entry')
+
+
+def bench_contention(ops=200_000, n_accounts=16, workers=(1, 2, 4, 8)):
+    '''Transfer throughput across thread-safe accounts as workers increase.'''
+    print(f'contention: {ops:,} transfers over {n_accounts} accounts')
+    for n_workers in workers:
+        accounts = [
+            Account('f', 'l', str(i), 1_000, thread_safe=True)
+            for i in range(n_accounts)
+        ]
+        per_worker = ops // n_workers
+
+        def work(seed):
+            rng = random.Random(seed)
+            for _ in range(per_worker):
+                src, dst = rng.sample(accounts, 2)
+                try:
+                    transfer(src, dst, rng.randint(1, 50))
+                except OverdraftNotAllowed:
+                    pass
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(n_workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        total = sum(acct.balance for acct in accounts)
+        assert total == 1_000 * n_accounts, 'money was created or destroyed'
+        assert all(acct.balance >= 0 for acct in accounts)
+        print(f'  {n_workers:>2} workers {per_worker * n_workers / elapsed:12,.0f} tx/sec')
+
+
+def bench_async_service(requests=50_000, n_accounts=100):
+    '''Concurrent deposit/withdraw requests through AccountService.'''
+    print(f'async_service: {requests:,} concurrent requests over {n_accounts} accounts')
+
+    async def run():
+        accounts = [Account('f', 'l', str(i), 1_000) for i in range(n_accounts)]
+        rng = random.Random(0)
+        async with AccountService(accounts) as service:
+            calls = []
+            for _ in range(requests):
+                acct_no = str(rng.randrange(n_accounts))
+                if rng.random() < 0.8:
+                    calls.append(service.deposit(acct_no, rng.randint(1, 100)))
+                else:
+                    calls.append(service.withdraw(acct_no, rng.randint(1, 100)))
+            start = time.perf_counter()
+            await asyncio.gather(*calls, return_exceptions=True)
+            elapsed = time.perf_counter() - start
+        entries = sum(len(acct.ledger) - 1 for acct in accounts)
+        print(f'  {requests / elapsed:12,.0f} requests/sec, '
+              f'{entries:,} ledger entries written')
+
+    asyncio.run(run())
+
+
+def bench_replay(n=1_000_000, n_accounts=1_000):
+    '''Rebuilding accounts from a transaction log: per-call vs replay().'''
+    print(f'replay: {n:,} transactions over {n_accounts:,} accounts')
+    rng = random.Random(0)
+    start_dt = datetime(2021, 1, 1)
+    records = [
+        (str(rng.randrange(n_accounts)), start_dt + timedelta(seconds=i), rng.randint(1, 100))
+        for i in range(n)
+    ]
+
+    start = time.perf_counter()
+    accounts = {}
+    for number, _, amount in records:
+        acct = accounts.get(number)
+        if acct is None:
+            acct = accounts[number] = Account('f', 'l', number)
+        acct.deposit(amount)
+    print(f'  {"deposit() per record":<24} {time.perf_counter() - start:8.2f} s')
+
+    # the same log with epoch-nanosecond stamps, as ledgers store them
+    ns_records = [
+        (number, int(ts.replace(tzinfo=timezone.utc).timestamp()) * 10**9, amount)
+        for number, ts, amount in records
+    ]
+    for label, log, kwargs in (
+        ('replay, 1 process', records, {'processes': 1}),
+        ('replay, process pool', records, {}),
+        ('replay, list ledgers', records, {'processes': 1, 'columnar': False}),
+        ('replay, ns timestamps', ns_records, {'processes': 1}),
+    ):
+        start = time.perf_counter()
+        replay(log, **kwargs)
+        print(f'  {label:<24} {time.perf_counter() - start:8.2f} s')
+
+
+class _UtcNowClock:
+    '''The old timestamping: build a datetime for every entry.'''
+    def now(self):
+        return datetime.now(timezone.utc)
+
+
+def bench_clock(n=500_000):
+    '''deposit() throughput with different ledger clocks.'''
+    print(f'clock: {n:,} deposits')
+    batch_clock = BatchClock()
+    for label, clock in (
+        ('datetime per entry', _UtcNowClock()),  # converted to ns on entry
+        ('CoarseClock (default)', None),
+        ('FrozenClock', FrozenClock(0)),
+        ('BatchClock, one batch', batch_clock),
+    ):
+        acct = Account('f', 'l', '1', clock=clock)
+        start = time.perf_counter()
+        with batch_clock.batch():
+            for _ in range(n):
+                acct.deposit(1)
+        elapsed = time.perf_counter() - start
+        print(f'  {label:<22} {n / elapsed:12,.0f} deposits/sec')
+
+
+def bench_money(n=1_000_000):
+    '''Summing cent amounts: float vs Decimal vs integer minor units (what
+    Account keeps internally) vs Money objects, then deposit() cost.'''
+    print(f'money: {n:,} additions of 0.01..9.99')
+    rng = random.Random(0)
+    cents = [rng.randint(1, 999) for _ in range(n)]
+    expected = Decimal(sum(cents)).scaleb(-2)
+    for label, amounts, zero in (
+        ('float', [c / 100 for c in cents], 0.0),
+        ('Decimal', [Decimal(c).scaleb(-2) for c in cents], Decimal(0)),
+        ('int minor units', cents, 0),
+        ('Money', [Money.from_units(c) for c in cents], Money(0)),
+    ):
+        start = time.perf_counter()
+        total = zero
+        for amount in amounts:
+            total = total + amount
+        elapsed = time.perf_counter() - start
+        if type(total) is int:
+            total = Money.from_units(total)
+        exact = 'exact' if Decimal(str(total)) == expected else f'off: {total}'
+        print(f'  {label:<22} {n / elapsed:12,.0f} adds/sec   {exact}')
+
+    deposits = n // 5
+    for label, amount in (
+        ('deposit(int)', 7),
+        ('deposit(Money)', Money(7)),
+        ('deposit(Decimal)', Decimal('0.07')),
+        ('deposit(float)', 0.07),
+    ):
+        acct = Account('f', 'l', '1', clock=FrozenClock(0))
+        start = time.perf_counter()
+        for _ in range(deposits):
+            acct.deposit(amount)
+        elapsed = time.perf_counter() - start
+        print(f'  {label:<22} {deposits / elapsed:12,.0f} deposits/sec   balance {acct.balance}')
+
+
+def bench_settlement(n=200_000, n_accounts=300):
+    '''A payment batch: one transfer() per item vs netted settle().'''
+    print(f'settlement: {n:,} transfers among {n_accounts} accounts')
+    rng = random.Random(0)
+    pairs = [rng.sample(range(n_accounts), 2) for _ in range(n)]
+    amounts = [rng.randint(1, 100) for _ in range(n)]
+    for label, run in (
+        ('transfer() per item', lambda batch: [transfer(*t) for t in batch]),
+        ('settle()', settle),
+        ('settle(itemised=True)', lambda batch: settle(batch, itemised=True)),
+    ):
+        accounts = [
+            Account('f', 'l', str(i), 1_000_000, thread_safe=True)
+            for i in range(n_accounts)
+        ]
+        batch = [
+            (accounts[src], accounts[dst], amount)
+            for (src, dst), amount in zip(pairs, amounts)
+        ]
+        start = time.perf_counter()
+        run(batch)
+        elapsed = time.perf_counter() - start
+        assert sum(acct.balance for acct in accounts) == 1_000_000 * n_accounts
+        entries = sum(len(acct.ledger) - 1 for acct in accounts)
+        print(f'  {label:<22} {n / elapsed:12,.0f} transfers/sec, '
+              f'{entries:,} ledger entries')
+
+
+def _export_materialized(accounts, path):
+    '''The old way: copy each whole ledger, then format every row.'''
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for acct in accounts:
+            rows = tuple(acct.ledger)
+            writer.writerows(
+                (acct.account_number, dt.isoformat(), value, balance)
+                for dt, value, balance in rows
+            )
+
+
+def bench_ledger_io(n=1_000_000, n_accounts=10):
+    '''Ledger export/import: time and peak memory (the accounts themselves
+    are built beforehand and not counted).'''
+    print(f'ledger_io: {n:,} entries over {n_accounts} accounts')
+    per_account = n // n_accounts
+    accounts = [
+        Account('f', 'l', str(i), ledger_storage=ColumnarLedger(), clock=FrozenClock(0, 1))
+        for i in range(n_accounts)
+    ]
+    for acct in accounts:
+        acct.deposit_many([1] * per_account)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'ledgers.csv')
+        bin_path = os.path.join(tmp, 'ledgers.bin')
+        for label, run in (
+            ('materialize + format', lambda: _export_materialized(accounts, csv_path)),
+            ('write_csv', lambda: write_csv(accounts, csv_path)),
+            ('write_columns', lambda: write_columns(accounts, bin_path)),
+            # consume each imported account before reading the next
+            ('read_csv', lambda: [len(a.ledger) for a in read_csv(csv_path, ColumnarLedger)]),
+            ('read_columns', lambda: [len(a.ledger) for a in read_columns(bin_path, ColumnarLedger)]),
+        ):
+            elapsed, peak = _measure_peak(run)
+            print(f'  {label:<22} {elapsed:8.2f} s   peak {peak / 2**20:8.1f} MiB')
+
+
+def _month_end_per_account(accounts, rate, fee):
+    '''The old way: a deposit()/withdraw() call per account.'''
+    for acct in accounts:
+        balance = acct.balance
+        if balance > 0:
+            interest = round(Fraction(balance.units) * rate)
+            if interest:
+                acct.deposit(Money.from_units(interest))
+        elif balance < 0 and acct.is_overdraft_allowed:
+            acct.withdraw(fee)
+
+
+def bench_account_book(n_accounts=200_000):
+    '''Month-end interest and overdraft fees: per-account calls vs AccountBook.'''
+    print(f'account_book: {n_accounts:,} accounts')
+    rate, fee = Fraction(1, 3650), 25
+
+    def make_accounts():
+        rng = random.Random(0)
+        accounts = []
+        for i in range(n_accounts):
+            acct = Account('f', 'l', str(i), is_overdraft_allowed=i % 4 == 0)
+            amount = rng.randint(-10_000, 10_000)
+            if amount > 0 or acct.is_overdraft_allowed:
+                acct.apply_batch([amount] if amount else [])
+            accounts.append(acct)
+        return accounts
+
+    accounts = make_accounts()
+    start = time.perf_counter()
+    _month_end_per_account(accounts, rate, fee)
+    expected = [acct.balance for acct in accounts]
+    print(f'  {"deposit/withdraw loop":<22} {time.perf_counter() - start:8.2f} s')
+
+    accounts = make_accounts()
+    start = time.perf_counter()
+    book = AccountBook(accounts)
+    # fees first: interest accrues on balances that are positive already
+    book.charge_overdraft_fee(fee)
+    book.accrue_interest(rate)
+    print(f'  {"AccountBook":<22} {time.perf_counter() - start:8.2f} s')
+    assert [acct.balance for acct in accounts] == expected
+
+
+def bench_instrumentation(ops=500_000, n_accounts=1_000):
+    '''Mixed workload throughput with instrumentation off, on, and off again.'''
+    print(f'instrumentation: {ops:,} mixed operations')
+    plan = make_plan(ops, n_accounts)
+    metrics = Instrumentation()
+    for label, enabled in (('disabled', False), ('enabled', True), ('disabled again', False)):
+        accounts = make_accounts(n_accounts)
+        if enabled:
+            metrics.enable()
+        try:
+            start = time.perf_counter()
+            run_plan(accounts, plan)
+            elapsed = time.perf_counter() - start
+        finally:
+            metrics.disable()
+        print(f'  {label:<22} {ops / elapsed:12,.0f} ops/sec')
+
+
+def bench_rejections(n=500_000):
+    '''Probing withdrawals that mostly fail: raising vs non-raising APIs.'''
+    print(f'rejections: {n:,} candidate withdrawals, most rejected')
+    rng = random.Random(0)
+    amounts = [rng.randint(1, 1_000) for _ in range(n)]
+
+    def raising(acct):
+        for amount in amounts:
+            try:
+                acct.withdraw(amount)
+            except OverdraftNotAllowed:
+                pass
+
+    def try_withdraw(acct):
+        for amount in amounts:
+            acct.try_withdraw(amount)
+
+    def can_withdraw(acct):
+        for amount in amounts:
+            acct.can_withdraw(amount)
+
+    for label, run in (
+        ('withdraw + except', raising),
+        ('try_withdraw', try_withdraw),
+        ('can_withdraw', can_withdraw),
+        ('can_withdraw_many', lambda acct: acct.can_withdraw_many(amounts)),
+    ):
+        # covers the smallest ~10% of amounts until accepted ones drain it
+        acct = Account('f', 'l', '1', 100, clock=FrozenClock(0))
+        start = time.perf_counter()
+        run(acct)
+        elapsed = time.perf_counter() - start
+        print(f'  {label:<22} {n / elapsed:12,.0f} candidates/sec')
+
+
+BENCHMARKS = {
+    'ledger_memory': bench_ledger_memory,
+    'slots_memory': bench_slots_memory,
+    'contention': bench_contention,
+    'async_service': bench_async_service,
+    'replay': bench_replay,
+    'clock': bench_clock,
+    'money': bench_money,
+    'settlement': bench_settlement,
+    'ledger_io': bench_ledger_io,
+    'account_book': bench_account_book,
+    'instrumentation': bench_instrumentation,
+    'rejections': bench_rejections,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,219 @@
+'''
+Opt-in instrumentation of Account mutations.
+
+While enabled, the instrumented Account methods are replaced on the class
+by wrappers that count calls, time them into a latency histogram and count
+rejections: by exception type, or by status name for calls such as
+try_withdraw() that report a rejection as a non-OK WithdrawStatus.
+Disabling puts the original methods back, so instrumentation costs
+nothing at all when it is off:
+
+    metrics = Instrumentation()
+    with metrics:                 # or metrics.enable() / metrics.disable()
+        run_workload()
+    print(metrics.to_prometheus())
+
+Only one Instrumentation can be enabled on a class at a time.
+'''
+import time
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+
+from solutions import Account, WithdrawStatus
+
+
+OPERATIONS = (
+    'deposit',
+    'withdraw',
+    'try_withdraw',
+    'apply_batch',
+    'deposit_many',
+    'withdraw_many',
+    '_make_ledger_entry',
+)
+
+# upper bounds in seconds, Prometheus style; the last bucket is +Inf
+DEFAULT_BUCKETS = (
+    1e-7, 2.5e-7, 5e-7, 1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 1e-3, 1e-2,
+)
+
+
+class Histogram:
+    '''Cumulative-style latency histogram with fixed bucket bounds.'''
+    __slots__ = ('_bounds', '_bounds_ns', '_counts', '_sum_ns', '_count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._bounds = tuple(sorted(buckets))
+        self._bounds_ns = [round(bound * 1e9) for bound in self._bounds]
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._sum_ns = 0
+        self._count = 0
+
+    def observe_ns(self, duration_ns):
+        self._counts[bisect_left(self._bounds_ns, duration_ns)] += 1
+        self._sum_ns += duration_ns
+        self._count += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        '''Total observed time in seconds.'''
+        return self._sum_ns / 1e9
+
+    def buckets(self):
+        '''(upper bound in seconds, cumulative count) pairs, ending with +Inf.'''
+        total = 0
+        result = []
+        for bound, count in zip(self._bounds + (float('inf'),), self._counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        '''Upper bound of the bucket holding the q-th quantile (0 < q <= 1).'''
+        target = q * self._count
+        for bound, total in self.buckets():
+            if total >= target:
+                return bound
+        return float('inf')
+
+
+class OperationMetrics:
+    __slots__ = ('calls', 'rejections', 'latency')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.calls = 0
+        self.rejections = {}  # exception class or status name -> count
+        self.latency = Histogram(buckets)
+
+    def __repr__(self):
+        return (
+            f'OperationMetrics(calls={self.calls}, rejections={self.rejections}, '
+            f'p50<={self.latency.quantile(0.5)}s, p99<={self.latency.quantile(0.99)}s)'
+        )
+
+
+class Instrumentation:
+    def __init__(self, cls=Account, operations=OPERATIONS, buckets=DEFAULT_BUCKETS):
+        self._cls = cls
+        self._operations = tuple(operations)
+        self._buckets = buckets
+        self._metrics = {name: OperationMetrics(buckets) for name in self._operations}
+        self._originals = None
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self._originals is not None
+
+    def __getitem__(self, operation):
+        return self._metrics[operation]
+
+    def __iter__(self):
+        return iter(self._metrics.items())
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.disable()
+
+    def enable(self):
+        if self.enabled:
+            return
+        for name in self._operations:
+            if getattr(getattr(self._cls, name), '__instrumented__', False):
+                raise RuntimeError(f'{self._cls.__name__}.{name} is already instrumented.')
+        self._originals = {name: self._cls.__dict__[name] for name in self._operations}
+        for name, method in self._originals.items():
+            setattr(self._cls, name, self._wrap(method, self._metrics[name]))
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for name, method in self._originals.items():
+            setattr(self._cls, name, method)
+        self._originals = None
+
+    def reset(self):
+        with self._lock:
+            # in place: enabled wrappers hold on to these objects
+            for metrics in self._metrics.values():
+                metrics.__init__(self._buckets)
+
+    def _wrap(self, method, metrics):
+        perf_counter_ns = time.perf_counter_ns
+        lock = self._lock
+
+        def reject(reason):
+            with lock:
+                metrics.rejections[reason] = metrics.rejections.get(reason, 0) + 1
+
+        @wraps(method)
+        def instrumented(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as ex:
+                reject(type(ex).__name__)
+                raise
+            else:
+                # OK is 0, so any true status is a rejection
+                if type(result) is WithdrawStatus and result:
+                    reject(result.name)
+                return result
+            finally:
+                elapsed = perf_counter_ns() - start
+                with lock:
+                    metrics.calls += 1
+                    metrics.latency.observe_ns(elapsed)
+
+        instrumented.__instrumented__ = True
+        return instrumented
+
+    def to_prometheus(self, prefix='account'):
+        '''The metrics in the Prometheus text exposition format.'''
+        lines = [
+            f'# HELP {prefix}_operation_calls_total Calls per Account operation.',
+            f'# TYPE {prefix}_operation_calls_total counter',
+        ]
+        with self._lock:
+            metrics = list(self._metrics.items())
+            for name, op in metrics:
+                lines.append(f'{prefix}_operation_calls_total{{operation="{name}"}} {op.calls}')
+            lines += [
+                f'# HELP {prefix}_operation_rejections_total '
+                f'Rejected calls, by exception or status.',
+                f'# TYPE {prefix}_operation_rejections_total counter',
+            ]
+            for name, op in metrics:
+                for reason, count in sorted(op.rejections.items()):
+                    lines.append(
+                        f'{prefix}_operation_rejections_total'
+                        f'{{operation="{name}",reason="{reason}"}} {count}'
+                    )
+            lines += [
+                f'# HELP {prefix}_operation_duration_seconds Latency per Account operation.',
+                f'# TYPE {prefix}_operation_duration_seconds histogram',
+            ]
+            for name, op in metrics:
+                for bound, total in op.latency.buckets():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(
+                        f'{prefix}_operation_duration_seconds_bucket'
+                        f'{{operation="{name}",le="{le}"}} {total}'
+                    )
+                lines.append(
+                    f'{prefix}_operation_duration_seconds_sum{{operation="{name}"}} '
+                    f'{op.latency.sum!r}'
+                )
+                lines.append(
+                    f'{prefix}_operation_duration_seconds_count{{operation="{name}"}} '
+                    f'{op.latency.count}'
+                )
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,279 @@
+'''
+Reproducible micro-benchmark suite for the Account lifecycle.
+
+Covers construction (including the opening ledger entry), deposit and
+withdraw throughput, ledger property access, __repr__/__str__, __eq__ and
+the OverdraftNotAllowed rejection path, each across a range of ledger
+history sizes. Every benchmark is a pyperf-style time function: given a
+loop count it returns the elapsed seconds.
+
+With pyperf installed the suite runs under pyperf.Runner (worker
+processes, calibration, system-noise checks; use its -o/--append and
+`python -m pyperf compare_to` for baselines):
+
+    python account_perf.py -o baseline.json
+
+Without pyperf a timeit-style runner takes its place: loops are
+calibrated to a minimum run time, each benchmark is repeated, and results
+are saved to and compared against JSON baselines:
+
+    python account_perf.py --output baseline.json
+    python account_perf.py --compare-to baseline.json --sizes 10,1000
+    python account_perf.py --bench deposit,ledger_last
+
+Histories of up to HISTORY_LIST_LIMIT entries use the default list
+storage; larger ones use ColumnarLedger, since ten million LedgerEntry
+objects need gigabytes of memory.
+'''
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+from solutions import (
+    Account, ColumnarLedger, FrozenClock, LedgerEntry, OverdraftNotAllowed, get_currency
+)
+
+try:
+    import pyperf
+except ImportError:
+    pyperf = None
+
+
+DEFAULT_SIZES = (10, 1_000, 100_000, 10_000_000)
+HISTORY_LIST_LIMIT = 1_000_000
+# large enough that the withdraw benchmark never runs out of money
+_OPENING_BALANCE = 10 ** 15
+
+_histories = {}
+
+
+def _account(size, number='1'):
+    '''An account whose ledger holds size entries, built once per (size,
+    number). Benchmarks that write use their own account number, so the
+    ones that only read see exactly size entries.'''
+    key = (size, number)
+    account = _histories.get(key)
+    if account is None:
+        times = range(size)
+        balances = range(_OPENING_BALANCE, _OPENING_BALANCE + size)
+        if size > HISTORY_LIST_LIMIT:
+            ledger = ColumnarLedger.from_columns(times, [1] * size, balances)
+        else:
+            usd = get_currency('USD')
+            ledger = [LedgerEntry(t, 1, b, usd) for t, b in zip(times, balances)]
+        account = Account('f', 'l', number, ledger_storage=ledger, clock=FrozenClock(size))
+        _histories[key] = account
+    return account
+
+
+def _time_loop(func, loops):
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for _ in range(loops):
+        func()
+    return perf_counter() - start
+
+
+def bench_construct(loops, size=None):
+    clock = FrozenClock(0)
+
+    def construct():
+        Account('f', 'l', '1', 100, clock=clock)
+    return _time_loop(construct, loops)
+
+
+def bench_deposit(loops, size):
+    account = _account(size, 'deposit')
+    return _time_loop(lambda: account.deposit(1), loops)
+
+
+def bench_withdraw(loops, size):
+    account = _account(size, 'withdraw')
+    return _time_loop(lambda: account.withdraw(1), loops)
+
+
+def bench_overdraft_rejected(loops, size):
+    account = _account(size)
+    amount = account.balance + 1
+
+    def rejected():
+        try:
+            account.withdraw(amount)
+        except OverdraftNotAllowed:
+            pass
+    return _time_loop(rejected, loops)
+
+
+def bench_ledger_property(loops, size):
+    account = _account(size)
+    return _time_loop(lambda: account.ledger, loops)
+
+
+def bench_ledger_last(loops, size):
+    account = _account(size)
+    return _time_loop(lambda: account.ledger[-1], loops)
+
+
+def bench_repr(loops, size):
+    account = _account(size)
+    return _time_loop(lambda: repr(account), loops)
+
+
+def bench_str(loops, size):
+    account = _account(size)
+    return _time_loop(lambda: str(account), loops)
+
+
+def bench_eq(loops, size):
+    account, other = _account(size), _account(size, 'other')
+    return _time_loop(lambda: account == other, loops)
+
+
+# name -> (time function, depends on history size)
+BENCHMARKS = {
+    'construct': (bench_construct, False),
+    'deposit': (bench_deposit, True),
+    'withdraw': (bench_withdraw, True),
+    'overdraft_rejected': (bench_overdraft_rejected, True),
+    'ledger_property': (bench_ledger_property, True),
+    'ledger_last': (bench_ledger_last, True),
+    'repr': (bench_repr, True),
+    'str': (bench_str, True),
+    'eq': (bench_eq, True),
+}
+
+
+def _cases(names, sizes):
+    '''(benchmark name, time function, size) for every requested combination.'''
+    for name in names:
+        func, sized = BENCHMARKS[name]
+        if sized:
+            for size in sizes:
+                yield f'{name}[{size}]', func, size
+        else:
+            yield name, func, None
+
+
+def _calibrate(func, size, min_time):
+    loops = 1
+    while True:
+        if func(loops, size) >= min_time or loops >= 1 << 24:
+            return loops
+        loops *= 2
+
+
+def run_timeit(cases, repeat=5, min_time=0.05):
+    '''Fallback runner: returns {name: result} with per-loop timings.'''
+    results = {}
+    for name, func, size in cases:
+        func(1, size)  # warm up (and build the history)
+        loops = _calibrate(func, size, min_time)
+        values = [func(loops, size) / loops for _ in range(repeat)]
+        results[name] = {
+            'loops': loops,
+            'values': values,
+            'mean': statistics.fmean(values),
+            'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+            'min': min(values),
+        }
+        print(f'{name:<32} {_format(results[name]["mean"])} '
+              f'+- {_format(results[name]["stdev"])}')
+    return results
+
+
+def _format(seconds):
+    for unit, scale in (('ns', 1e9), ('us', 1e6), ('ms', 1e3)):
+        if seconds * scale < 1000:
+            return f'{seconds * scale:7.1f} {unit}'
+    return f'{seconds:7.2f} s '
+
+
+def _metadata():
+    return {
+        'python': sys.version,
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(results, baseline, threshold=0.10):
+    '''Print the change against a baseline; returns the names that got slower
+    by more than threshold (as a fraction).'''
+    slower = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        # min is the least noisy estimate of the true cost
+        change = result['min'] / base['min'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  SLOWER'
+            slower.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f'{name:<32} {_format(base["min"])} -> {_format(result["min"])} '
+              f'({change:+.1%}){flag}')
+    return slower
+
+
+def _add_arguments(parser):
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated ledger history sizes')
+    parser.add_argument('--bench', default=','.join(BENCHMARKS),
+                        help='comma-separated benchmark names')
+
+
+def _parse_list(text, kind=str):
+    return [kind(item) for item in text.split(',') if item]
+
+
+def _worker_args(cmd, args):
+    # pyperf re-runs this script in worker processes; pass our options on
+    cmd.extend(('--sizes', args.sizes, '--bench', args.bench))
+
+
+def main_pyperf():
+    runner = pyperf.Runner(add_cmdline_args=_worker_args)
+    _add_arguments(runner.argparser)
+    args = runner.parse_args()
+    runner.metadata.update({'account_perf_sizes': args.sizes})
+    for name, func, size in _cases(_parse_list(args.bench), _parse_list(args.sizes, int)):
+        runner.bench_time_func(name, func, size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    _add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='minimum seconds per timed run')
+    parser.add_argument('--output', help='save results as a JSON baseline')
+    parser.add_argument('--compare-to', help='JSON baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='slowdown (fraction) reported as a regression')
+    args = parser.parse_args(argv)
+
+    cases = _cases(_parse_list(args.bench), _parse_list(args.sizes, int))
+    results = run_timeit(cases, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': _metadata(), 'benchmarks': results}, f, indent=2)
+    if args.compare_to:
+        with open(args.compare_to) as f:
+            baseline = json.load(f)['benchmarks']
+        print()
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    if pyperf is not None and '--no-pyperf' not in sys.argv:
+        main_pyperf()
+    else:
+        sys.exit(main([arg for arg in sys.argv[1:] if arg != '--no-pyperf']))
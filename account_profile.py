@@ -0,0 +1,125 @@
+'''
+Profiling harness: drives Account with a realistic mixed workload.
+
+The workload is deterministic for a given seed and runs as one long loop
+with no harness code on the hot path, so it profiles cleanly under
+cProfile, under perf (python -X perf on 3.12+, then perf record/report),
+or with the opt-in instrumentation from account_metrics:
+
+    python account_profile.py                       # just time it
+    python account_profile.py --cprofile            # cProfile, top 25 by tottime
+    python account_profile.py --metrics             # Prometheus-style metrics
+    python -X perf account_profile.py --ops 5000000 # under `perf record -g`
+'''
+import argparse
+import cProfile
+import pstats
+import random
+import time
+
+from account_metrics import Instrumentation
+from solutions import Account, OverdraftNotAllowed
+
+
+# share of operations in the mix; the remainder are reads
+MIX = (
+    ('deposit', 0.45),
+    ('withdraw', 0.30),
+    ('apply_batch', 0.05),
+    ('invalid', 0.02),
+)
+
+
+def make_accounts(n_accounts, seed=0):
+    rng = random.Random(seed)
+    return [
+        Account('f', 'l', str(i), rng.randint(0, 10_000), is_overdraft_allowed=i % 10 == 0)
+        for i in range(n_accounts)
+    ]
+
+
+def make_plan(ops, n_accounts, seed=0):
+    '''Precompute (operation, account index, argument) triples, so that random
+    number generation does not show up in profiles.'''
+    rng = random.Random(seed)
+    names = [name for name, _ in MIX] + ['read']
+    weights = [weight for _, weight in MIX] + [1 - sum(weight for _, weight in MIX)]
+    plan = []
+    for name in rng.choices(names, weights, k=ops):
+        i = rng.randrange(n_accounts)
+        if name in ('deposit', 'withdraw'):
+            # mostly small amounts, with an occasional large one that overdraws
+            arg = rng.randint(1, 200) if rng.random() < 0.97 else rng.randint(10_000, 50_000)
+        elif name == 'apply_batch':
+            arg = [rng.choice((1, -1)) * rng.randint(1, 100) for _ in range(rng.randint(2, 20))]
+        elif name == 'invalid':
+            arg = rng.choice((0, -5, '1.234'))
+        else:
+            arg = None
+        plan.append((name, i, arg))
+    return plan
+
+
+def run(accounts, plan):
+    '''Execute plan against accounts; returns the number of rejected operations.'''
+    rejected = 0
+    for name, i, arg in plan:
+        acct = accounts[i]
+        try:
+            if name == 'deposit':
+                acct.deposit(arg)
+            elif name == 'withdraw':
+                acct.withdraw(arg)
+            elif name == 'apply_batch':
+                acct.apply_batch(arg)
+            elif name == 'invalid':
+                acct.deposit(arg)
+            else:
+                acct.balance
+                ledger = acct.ledger
+                ledger[len(ledger) // 2]
+        except (ValueError, OverdraftNotAllowed):
+            rejected += 1
+    return rejected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--ops', type=int, default=1_000_000)
+    parser.add_argument('--accounts', type=int, default=1_000)
+    parser.add_argument('--seed', type=int, default=0)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--cprofile', action='store_true', help='run under cProfile')
+    group.add_argument('--metrics', action='store_true', help='enable instrumentation')
+    parser.add_argument('--sort', default='tottime', help='pstats sort key')
+    args = parser.parse_args(argv)
+
+    accounts = make_accounts(args.accounts, args.seed)
+    plan = make_plan(args.ops, args.accounts, args.seed)
+    metrics = Instrumentation() if args.metrics else None
+    profiler = cProfile.Profile() if args.cprofile else None
+
+    if metrics is not None:
+        metrics.enable()
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        rejected = run(accounts, plan)
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        if metrics is not None:
+            metrics.disable()
+
+    print(f'{args.ops:,} operations in {elapsed:.2f} s '
+          f'({args.ops / elapsed:,.0f} ops/sec), {rejected:,} rejected')
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats(args.sort).print_stats(25)
+    if metrics is not None:
+        print(metrics.to_prometheus(), end='')
+
+
+if __name__ == '__main__':
+    main()
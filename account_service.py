@@ -0,0 +1,146 @@
+'''
+asyncio front-end for Account objects.
+
+All mutations of a given account go through that account's queue and are
+applied by a single worker task, so handlers never touch an Account
+directly and no locks are needed. Bursts of deposits that pile up in a
+queue are coalesced into one deposit_many() call, i.e. one ledger write.
+
+    async with AccountService(accounts) as service:
+        await service.deposit('123456', 100)
+        await service.withdraw('123456', 30)
+        print(await service.balance('123456'))
+'''
+import asyncio
+from itertools import accumulate
+
+from solutions import AccountRegistry
+
+
+_DEPOSIT = 'deposit'
+_WITHDRAW = 'withdraw'
+
+
+class AccountService:
+    def __init__(self, accounts=()):
+        if isinstance(accounts, AccountRegistry):
+            self._registry = accounts
+        else:
+            self._registry = AccountRegistry(accounts)
+        self._queues = {}
+        self._workers = {}
+
+    @property
+    def registry(self):
+        return self._registry
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        '''Finish queued work, then stop all worker tasks.'''
+        await asyncio.gather(*(queue.join() for queue in self._queues.values()))
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._queues.clear()
+        self._workers.clear()
+
+    def _queue_for(self, account_number):
+        queue = self._queues.get(account_number)
+        if queue is None:
+            account = self._registry[account_number]  # KeyError if unknown
+            queue = self._queues[account_number] = asyncio.Queue()
+            self._workers[account_number] = asyncio.create_task(
+                self._run(account, queue)
+            )
+        return queue
+
+    async def _submit(self, account_number, op, value):
+        future = asyncio.get_running_loop().create_future()
+        self._queue_for(account_number).put_nowait((op, value, future))
+        return await future
+
+    def _money(self, account_number, value):
+        # convert up front so bad amounts fail in the caller, not the worker
+        currency = self._registry[account_number].currency
+        return currency.money(currency.to_units(value))
+
+    async def deposit(self, account_number, value):
+        '''Deposit value; returns the balance right after this deposit.'''
+        value = self._money(account_number, value)
+        if value <= 0:
+            raise ValueError('Deposit value must be positive')
+        return await self._submit(account_number, _DEPOSIT, value)
+
+    async def withdraw(self, account_number, value):
+        '''Withdraw value; returns the balance right after this withdrawal.'''
+        value = self._money(account_number, value)
+        if value <= 0:
+            raise ValueError('Withdrawal value must be positive.')
+        return await self._submit(account_number, _WITHDRAW, value)
+
+    async def balance(self, account_number):
+        # mutations are applied synchronously by the workers, so reading the
+        # balance on the loop thread always sees a consistent value
+        return self._registry[account_number].balance
+
+    async def _run(self, account, queue):
+        while True:
+            requests = [await queue.get()]
+            # let the rest of a burst reach the queue before draining it
+            await asyncio.sleep(0)
+            while not queue.empty():
+                requests.append(queue.get_nowait())
+            try:
+                self._apply(account, requests)
+            finally:
+                for _ in requests:
+                    queue.task_done()
+
+    @staticmethod
+    def _apply(account, requests):
+        deposits = []
+        for op, value, future in requests:
+            if op == _DEPOSIT:
+                deposits.append((value, future))
+                continue
+            _apply_deposits(account, deposits)
+            deposits = []
+            try:
+                account.withdraw(value)
+            except Exception as ex:
+                _resolve(future, exception=ex)
+            else:
+                _resolve(future, account.balance)
+        _apply_deposits(account, deposits)
+
+
+def _apply_deposits(account, deposits):
+    if not deposits:
+        return
+    values = [value for value, _ in deposits]
+    start = account.balance
+    try:
+        account.deposit_many(values)
+    except Exception as ex:
+        for _, future in deposits:
+            _resolve(future, exception=ex)
+        return
+    balances = accumulate(values, initial=start)
+    next(balances)
+    for (_, future), balance in zip(deposits, balances):
+        _resolve(future, balance)
+
+
+def _resolve(future, result=None, exception=None):
+    # the caller may have been cancelled while its request was queued
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
@@ -0,0 +1,339 @@
+'''
+Write-ahead log with group commit and snapshots for Account state.
+
+Attach accounts to a WriteAheadLog and every ledger entry they make is
+appended to the log, and deposit(), withdraw() etc. return only once that
+record has been written and fsync'ed. Instead of one fsync per
+transaction, records are committed in groups: the first caller to find
+no fsync in progress writes everything pending, and the records of
+callers arriving in the meantime wait and go out together in the next
+group, so many transactions share one fsync. max_delay can hold a group
+open a little longer to gather more records, up to max_batch. Each change
+is one line of the log, and so is a whole transfer() or settle(), across
+all of its accounts: recovery restores all of it or none of it. Snapshots
+record each account's balance and the log position they are valid for,
+so recovery loads the latest snapshot and replays only the log tail:
+
+    wal = WriteAheadLog('state/')
+    wal.attach(acct)
+    acct.deposit(100)       # durable once it returns
+    wal.snapshot()
+    ...
+    accounts = WriteAheadLog.recover('state/')
+'''
+import json
+import os
+import threading
+import time
+
+from solutions import Account, LedgerEntry, current_change_group, get_currency
+
+
+LOG_NAME = 'wal.log'
+SNAPSHOT_NAME = 'snapshot.json'
+
+_OPEN = 'o'
+_CHANGE = 'c'
+
+
+def _dumps(record):
+    return (json.dumps(record, separators=(',', ':')) + '\n').encode()
+
+
+def _drop_torn_tail(path):
+    '''Truncate the log at path to its last complete line.
+
+    A crash mid-write can leave a partial record at the end; appending
+    after it would glue the next record onto it.
+    '''
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        end = pos = f.seek(0, os.SEEK_END)
+        keep = 0
+        while pos > 0:
+            start = max(0, pos - 4096)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b'\n')
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            pos = start
+        if keep < end:
+            f.truncate(keep)
+            os.fsync(f.fileno())
+
+
+class WriteAheadLog:
+    def __init__(self, directory, max_batch=1000, max_delay=0.0, snapshot_every=None):
+        '''
+        max_batch: stop holding a group open once this many records are pending.
+        max_delay: longest time (seconds) a group is held open for more
+            records before its fsync; 0 commits as soon as no other fsync is
+            in progress.
+        snapshot_every: take a snapshot after this many committed records
+            (None disables automatic snapshots).
+        '''
+        if max_batch < 1:
+            raise ValueError('max_batch must be at least 1.')
+        if max_delay < 0:
+            raise ValueError('max_delay must not be negative.')
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._max_batch = max_batch
+        self._max_delay = max_delay
+        self._snapshot_every = snapshot_every
+        log_path = os.path.join(directory, LOG_NAME)
+        _drop_torn_tail(log_path)
+        self._file = open(log_path, 'ab')
+        self._offset = self._file.tell()
+        self._accounts = {}
+        self._pending = []
+        self._appended = 0  # records handed to the log so far
+        self._durable = 0  # of those, records written and fsync'ed
+        self._committing = False
+        self._since_snapshot = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._snapshot_lock = threading.Lock()
+        self._closed = False
+        self._snapshotter = None
+        if snapshot_every:
+            # snapshots take account locks, which committing callers may be
+            # holding, so they are taken on a thread of their own
+            self._snapshotter = threading.Thread(target=self._snapshot_loop, daemon=True)
+            self._snapshotter.start()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self.commit()
+        for account in self._accounts.values():
+            account.remove_listener(self._on_change)
+        self._file.close()
+
+    def attach(self, account):
+        '''Start logging account; its current balance is logged as a base.'''
+        with account._lock:
+            record = {
+                'k': _OPEN,
+                'a': account.account_number,
+                'f': account.first_name,
+                'l': account.last_name,
+                'o': account.is_overdraft_allowed,
+                'c': account.currency.code,
+                'b': account.balance.units,
+                'n': len(account._ledger),
+                't': account.ledger[-1].ns,
+            }
+            self._accounts[account.account_number] = account
+            account.add_listener(self._on_change)
+            self._append([_dumps(record)])
+
+    def _on_change(self, account, old_balance, entries):
+        # called under the account's lock, right after the entries were added;
+        # returning only once they are durable makes the mutating call wait
+        first = len(account._ledger) - len(entries)
+        number = account.account_number
+        rows = [
+            [number, first + i, entry.ns, entry.units, entry.balance_units]
+            for i, entry in enumerate(entries)
+        ]
+        group = current_change_group()
+        if group is None:
+            self._append_change([rows])
+        else:
+            # a transfer() or settle(): logged as one line once all of its
+            # legs are in, so recovery sees all of it or none of it
+            group.defer(self, self._append_change, rows)
+
+    def _append_change(self, row_lists):
+        self._append([_dumps({'k': _CHANGE, 'e': [row for rows in row_lists for row in rows]})])
+
+    def _append(self, records):
+        '''Log records and wait until the group holding them is fsync'ed.'''
+        with self._lock:
+            self._pending.extend(records)
+            self._appended += len(records)
+            if len(self._pending) >= self._max_batch:
+                # a commit holding its group open can stop waiting
+                self._changed.notify_all()
+            self._commit_through(self._appended, self._max_delay)
+
+    def _snapshot_due(self):
+        return bool(self._snapshot_every) and self._since_snapshot >= self._snapshot_every
+
+    def _snapshot_loop(self):
+        while True:
+            with self._lock:
+                while not self._closed and not self._snapshot_due():
+                    self._changed.wait()
+                if self._closed:
+                    return
+            self.snapshot()
+
+    def commit(self):
+        '''Write and fsync all pending records; returns the log offset.'''
+        with self._lock:
+            return self._commit_through(self._appended)
+
+    def _commit_through(self, seq, delay=0.0):
+        # called with self._lock held; returns once the first seq records
+        # are durable. One caller at a time writes and fsyncs a group, with
+        # the lock released so that others can queue records for the next.
+        while self._durable < seq:
+            if self._committing:
+                self._changed.wait()
+                continue
+            self._committing = True
+            try:
+                if delay and len(self._pending) < self._max_batch:
+                    deadline = time.monotonic() + delay
+                    while len(self._pending) < self._max_batch and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._changed.wait(remaining)
+                records, self._pending = self._pending, []
+                target = self._appended
+                self._lock.release()
+                try:
+                    if records:
+                        self._file.write(b''.join(records))
+                        self._file.flush()
+                        os.fsync(self._file.fileno())
+                    offset = self._file.tell()
+                except BaseException:
+                    self._lock.acquire()
+                    # not durable: leave them for the next commit to retry
+                    self._pending[:0] = records
+                    raise
+                self._lock.acquire()
+                self._offset = offset
+                self._durable = target
+                self._since_snapshot += len(records)
+            finally:
+                self._committing = False
+                self._changed.notify_all()
+        return self._offset
+
+    def snapshot(self):
+        '''Atomically write a snapshot of all attached accounts.'''
+        with self._snapshot_lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        # Take the log offset first: anything an account does after we read
+        # its state below is logged after this offset, and anything before it
+        # is filtered out at recovery by its ledger index.
+        with self._lock:
+            offset = self._commit_through(self._appended)
+            self._since_snapshot = 0
+        accounts = []
+        for account in list(self._accounts.values()):
+            with account._lock:
+                accounts.append({
+                    'account_number': account.account_number,
+                    'first_name': account.first_name,
+                    'last_name': account.last_name,
+                    'is_overdraft_allowed': account.is_overdraft_allowed,
+                    'currency': account.currency.code,
+                    'balance': account.balance.units,
+                    'entries': len(account._ledger),
+                    # the base entry keeps the account's own time order
+                    'ns': account._ledger[-1].ns,
+                })
+        snapshot = {
+            'wal_offset': offset,
+            'taken_at': time.time_ns(),
+            'accounts': accounts,
+        }
+        path = os.path.join(self._directory, SNAPSHOT_NAME)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return offset
+
+    @staticmethod
+    def recover(directory, thread_safe=False):
+        '''Rebuild accounts from the latest snapshot plus the log tail.
+
+        Each recovered account's ledger starts with an entry holding its
+        snapshot balance, followed by the entries logged after it. Amounts
+        are logged in minor units.
+        '''
+        state = {}  # account_number -> [info, base_index, entries]
+        offset = 0
+        path = os.path.join(directory, SNAPSHOT_NAME)
+        if os.path.exists(path):
+            with open(path) as f:
+                snapshot = json.load(f)
+            offset = snapshot['wal_offset']
+            for info in snapshot['accounts']:
+                currency = get_currency(info['currency'])
+                entry = LedgerEntry(info['ns'], 0, info['balance'], currency)
+                state[info['account_number']] = [info, info['entries'], [entry]]
+
+        log_path = os.path.join(directory, LOG_NAME)
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # torn write at the end of the log
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a damaged record; it was never acknowledged
+                    if record['k'] == _OPEN:
+                        number = record['a']
+                        info = {
+                            'account_number': number,
+                            'first_name': record['f'],
+                            'last_name': record['l'],
+                            'is_overdraft_allowed': record['o'],
+                            'currency': record['c'],
+                        }
+                        currency = get_currency(record['c'])
+                        entry = LedgerEntry(record['t'], 0, record['b'], currency)
+                        state[number] = [info, record['n'], [entry]]
+                        continue
+                    for number, index, ns, value, balance in record['e']:
+                        account_state = state.get(number)
+                        if account_state is None or index < account_state[1]:
+                            continue  # already covered by the snapshot
+                        currency = get_currency(account_state[0]['currency'])
+                        account_state[2].append(LedgerEntry(ns, value, balance, currency))
+
+        return {
+            number: Account.from_history(
+                info['first_name'],
+                info['last_name'],
+                number,
+                entries,
+                is_overdraft_allowed=info['is_overdraft_allowed'],
+                thread_safe=thread_safe,
+                currency=info['currency']
+            )
+            for number, (info, _, entries) in state.items()
+        }
@@ -4,4 +4,299 @@ Use the pytz and dateutil libraries to convert this string into a UTC naive
 datetime object.
 
 t = "Feb 8, 2021 5:30pm (Denver Time)"
-'''
\ No newline at end of file
+'''
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import pytz
+from dateutil import parser as dateutil_parser
+
+
+t = "Feb 8, 2021 5:30pm (Denver Time)"
+
+
+# "X Time" labels that are not the last part of a tz database name
+TIME_LABELS = {
+    'Eastern': 'US/Eastern',
+    'Central': 'US/Central',
+    'Mountain': 'US/Mountain',
+    'Pacific': 'US/Pacific',
+    'Alaska': 'US/Alaska',
+    'Hawaii': 'US/Hawaii',
+    'Atlantic': 'Canada/Atlantic',
+    'Universal': 'UTC',
+    'Greenwich': 'GMT',
+}
+
+
+def zone_name(label):
+    '''The tz database name for a label such as 'Denver' or 'New York'.'''
+    if label in TIME_LABELS:
+        return TIME_LABELS[label]
+    key = label.replace(' ', '_').lower()
+    name = _zone_names().get(key)
+    if name is None:
+        raise ValueError(f'Unknown time zone label {label!r}.')
+    return name
+
+
+@lru_cache(maxsize=None)
+def _zone_names():
+    # last component of each zone name -> zone name; common zones win, so
+    # that e.g. 'Denver' maps to America/Denver and not a legacy alias
+    names = {}
+    for name in reversed(pytz.common_timezones):
+        names[name.rsplit('/', 1)[-1].lower()] = name
+    for name in pytz.all_timezones:
+        names.setdefault(name.rsplit('/', 1)[-1].lower(), name)
+    return names
+
+
+def parse_dateutil(text):
+    '''Baseline: generic dateutil parse, and a zone lookup for every string.'''
+    when, _, label = text.rpartition(' (')
+    label = label[:-len(' Time)')]
+    local = pytz.timezone(zone_name(label)).localize(dateutil_parser.parse(when))
+    return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_SECOND = timedelta(seconds=1)
+
+
+class ZoneTable:
+    '''A zone's UTC offset history as sorted arrays, for local -> UTC lookups.
+
+    Built once from pytz's transition list. Segment i starts at local time
+    local_starts[i] (in its own offset) and has offsets[i] seconds east of
+    UTC. A wall time that occurs twice (clocks going back) resolves to the
+    later, standard-time reading and one in a spring-forward gap to the
+    earlier offset, which is what pytz's localize() does by default.
+    '''
+    __slots__ = ('name', '_local_starts', '_offsets')
+
+    def __init__(self, tz):
+        self.name = tz.zone
+        transitions = getattr(tz, '_utc_transition_times', None)
+        if transitions is None:
+            # fixed-offset zone, e.g. UTC or Etc/GMT+7
+            offsets = [tz.utcoffset(_EPOCH) // _SECOND]
+            starts = [-(1 << 62)]
+        else:
+            offsets = [info[0] // _SECOND for info in tz._transition_info]
+            starts = [(ts - _EPOCH) // _SECOND for ts in transitions]
+            starts[0] = -(1 << 62)  # pytz uses datetime.min for "always"
+        self._offsets = array('q', offsets)
+        self._local_starts = array('q', [s + o for s, o in zip(starts, offsets)])
+
+    def to_utc(self, local_seconds):
+        '''UTC epoch seconds for a wall-clock time given as local epoch seconds.'''
+        i = bisect_right(self._local_starts, local_seconds) - 1
+        return local_seconds - self._offsets[max(i, 0)]
+
+
+@lru_cache(maxsize=None)
+def zone_table(label):
+    '''The cached ZoneTable for an "X Time" label (without " Time").'''
+    return ZoneTable(pytz.timezone(zone_name(label)))
+
+
+class TimezoneResolver:
+    '''Memoised UTC offsets per (zone label, local hour).
+
+    offset() answers from an LRU cache keyed by the label and the hour
+    bucket of the local time. On a miss pytz localizes the first and last
+    second of that hour; if both are unambiguous and agree, the offset
+    holds for the whole hour and is cached. Hours containing a transition
+    (a DST gap or a repeated hour) are cached as such, and times in them
+    are resolved exactly on every call: is_dst picks the reading of an
+    ambiguous or non-existent time as in pytz's localize(), and is_dst=None
+    raises pytz's AmbiguousTimeError/NonExistentTimeError instead.
+    '''
+    def __init__(self, maxsize=4096, is_dst=False):
+        self._is_dst = is_dst
+        self._bucket_offset = lru_cache(maxsize=maxsize)(self._resolve_bucket)
+        self.exact_lookups = 0
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _zone(label):
+        return pytz.timezone(zone_name(label))
+
+    def _resolve_bucket(self, label, bucket):
+        tz = self._zone(label)
+        start = _EPOCH + timedelta(hours=bucket)
+        try:
+            first = tz.localize(start, is_dst=None).utcoffset()
+            last = tz.localize(start + timedelta(seconds=3599), is_dst=None).utcoffset()
+        except (pytz.AmbiguousTimeError, pytz.NonExistentTimeError):
+            return None
+        return first // _SECOND if first == last else None
+
+    def _exact(self, label, local_seconds):
+        self.exact_lookups += 1
+        local = _EPOCH + timedelta(seconds=local_seconds)
+        return self._zone(label).localize(local, is_dst=self._is_dst).utcoffset() // _SECOND
+
+    def offset(self, label, local_seconds):
+        '''Seconds east of UTC in zone label at local time local_seconds
+        (wall-clock time as epoch seconds).'''
+        offset = self._bucket_offset(label, local_seconds // 3600)
+        if offset is None:
+            return self._exact(label, local_seconds)
+        return offset
+
+    def to_utc(self, label, local_seconds):
+        return local_seconds - self.offset(label, local_seconds)
+
+    def localize_to_utc(self, local, label):
+        '''Naive local datetime in zone label -> naive UTC datetime.'''
+        local_seconds = (local - _EPOCH) // _SECOND
+        return local - timedelta(seconds=self.offset(label, local_seconds))
+
+    @property
+    def hits(self):
+        return self._bucket_offset.cache_info().hits
+
+    @property
+    def misses(self):
+        return self._bucket_offset.cache_info().misses
+
+    def cache_info(self):
+        return self._bucket_offset.cache_info()
+
+    def cache_clear(self):
+        self._bucket_offset.cache_clear()
+        self.exact_lookups = 0
+
+
+_PATTERN = re.compile(
+    r'([A-Za-z]{3})[A-Za-z]*\.? (\d{1,2}), (\d{4}) (\d{1,2}):(\d{2}) ?([AaPp])[Mm]'
+    r' \((.+) Time\)'
+)
+_MONTHS = {
+    name: i
+    for i, name in enumerate(
+        ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+         'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1
+    )
+}
+
+
+def _day_seconds(month, day, year):
+    try:
+        ordinal = date(int(year), _MONTHS[month.lower()], int(day)).toordinal()
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid date {month} {day}, {year}.') from None
+    return (ordinal - _EPOCH_ORDINAL) * 86400
+
+
+def parse_many(strings, resolver=None):
+    '''Yield UTC epoch seconds for each "Mon D, YYYY h:mmam (Zone Time)" string.
+
+    Lines of a log repeat the same few dates and zones, so the day offset
+    and zone table for each distinct value are computed once; the rest is
+    one regex match and some integer arithmetic per string. Pass a
+    TimezoneResolver to get offsets from it (and its is_dst policy)
+    instead of the zone tables.
+    '''
+    match = _PATTERN.fullmatch
+    days = {}
+    tables = {}
+    for text in strings:
+        m = match(text.strip())
+        if m is None:
+            raise ValueError(f'Unrecognised timestamp {text!r}.')
+        month, day, year, hour, minute, meridiem, label = m.groups()
+        key = (month, day, year)
+        day_seconds = days.get(key)
+        if day_seconds is None:
+            if len(days) > 100_000:
+                days.clear()
+            day_seconds = days[key] = _day_seconds(month, day, year)
+        if resolver is None:
+            table = tables.get(label)
+            if table is None:
+                table = tables[label] = zone_table(label)
+        hour = int(hour)
+        if not 1 <= hour <= 12:
+            raise ValueError(f'Invalid hour in {text!r}.')
+        minute = int(minute)
+        if minute >= 60:
+            raise ValueError(f'Invalid minute in {text!r}.')
+        hour %= 12
+        if meridiem in 'pP':
+            hour += 12
+        local_seconds = day_seconds + hour * 3600 + minute * 60
+        if resolver is None:
+            yield table.to_utc(local_seconds)
+        else:
+            yield resolver.to_utc(label, local_seconds)
+
+
+def parse_array(strings, resolver=None):
+    '''parse_many() collected into an int64 array.'''
+    return array('q', parse_many(strings, resolver))
+
+
+def parse(text):
+    '''Parse one string into a naive UTC datetime.'''
+    return _EPOCH + timedelta(seconds=next(parse_many((text,))))
+
+
+def bench(n=200_000):
+    labels = ('Denver', 'New York', 'Los Angeles', 'London', 'Tokyo', 'Chicago')
+    months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+              'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+    lines = [
+        f'{months[i % 12]} {i % 28 + 1}, {2015 + i % 8} {i % 12 + 1}:{i % 60:02d}'
+        f'{"am" if i % 3 else "pm"} ({labels[i % len(labels)]} Time)'
+        for i in range(n)
+    ]
+    sample = lines[:2_000]
+    start = time.perf_counter()
+    expected = [parse_dateutil(line) for line in sample]
+    baseline = (time.perf_counter() - start) / len(sample)
+    assert [_EPOCH + timedelta(seconds=s) for s in parse_many(sample)] == expected
+
+    start = time.perf_counter()
+    parse_array(lines)
+    fast = (time.perf_counter() - start) / n
+    print(f'dateutil + pytz per string {1 / baseline:12,.0f} strings/sec')
+    print(f'parse_many                 {1 / fast:12,.0f} strings/sec '
+          f'({baseline / fast:.0f}x)')
+
+    # the localize()/astimezone() step on its own, per naive local datetime
+    locals_ = [
+        (dateutil_parser.parse(line.rpartition(' (')[0]), line.rpartition(' (')[2][:-6])
+        for line in sample
+    ] * (n // len(sample))
+    zones = {label: pytz.timezone(zone_name(label)) for _, label in locals_[:len(sample)]}
+    start = time.perf_counter()
+    expected = [
+        zones[label].localize(local).astimezone(pytz.utc).replace(tzinfo=None)
+        for local, label in locals_
+    ]
+    pytz_time = time.perf_counter() - start
+    resolver = TimezoneResolver()
+    start = time.perf_counter()
+    got = [resolver.localize_to_utc(local, label) for local, label in locals_]
+    resolver_time = time.perf_counter() - start
+    assert got == expected
+    info = resolver.cache_info()
+    print(f'pytz localize + astimezone {len(locals_) / pytz_time:12,.0f} conversions/sec')
+    print(f'TimezoneResolver           {len(locals_) / resolver_time:12,.0f} conversions/sec '
+          f'({info.hits:,} hits, {info.misses:,} misses, '
+          f'{resolver.exact_lookups:,} exact)')
+
+
+if __name__ == '__main__':
+    print(parse(t))
+    if '--bench' in sys.argv:
+        bench()
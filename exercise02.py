@@ -11,4 +11,412 @@ Hint: You'll want to read the Python docs for the find method available for
 strings:
 
 https://docs.python.org/3/library/stdtypes.html?highlight=string#str.find
-'''
\ No newline at end of file
+'''
+import codecs
+import gzip
+import html
+import random
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+
+url = 'https://en.wikipedia.org/wiki/John_von_Neumann'
+
+CHUNK_SIZE = 16 * 1024
+
+# a start tag may carry attributes (<title lang="en">); tags are matched
+# case-insensitively on the raw bytes, which is safe for any ASCII-compatible
+# charset (UTF-8, Latin-1, windows-125x, ...)
+_TITLE_START = re.compile(rb'<title(?:\s[^>]*)?>', re.I)
+_TITLE_END = re.compile(rb'</title\s*>', re.I)
+# only complete tags, so a charset cut off at a chunk boundary is not used
+_META_CHARSET = re.compile(rb'<meta\s[^>]*?charset\s*=\s*["\']?\s*([-\w.:]+)[^>]*>', re.I)
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([-\w.:]+)', re.I)
+_OPEN_TAG = re.compile(rb'<[^>]*\Z')  # a tag still open at the end of the data
+_UTF8_BOM = b'\xef\xbb\xbf'
+# longest partial tag carried over between chunks, and longest title kept
+_MAX_TAIL = 4096
+_MAX_TITLE = 64 * 1024
+
+
+def get_title(url):
+    '''The straightforward answer: download and decode the whole page.'''
+    text = requests.get(url).text
+    start = text.find('<title>') + len('<title>')
+    end = text.find('</title>', start)
+    return text[start:end]
+
+
+class TitleScanner:
+    '''Incremental <title> finder over a stream of byte chunks.
+
+    feed() each chunk (bytes, bytearray or memoryview) as it arrives; it
+    returns True once the end tag has been seen. Tags are matched in the
+    raw bytes, case-insensitively and with attributes, so the page is
+    never decoded: before the title only a possibly unfinished tag is
+    carried over to the next chunk, and after it only the title bytes are
+    kept. A <meta charset> (or http-equiv Content-Type) seen on the way is
+    remembered so title() can decode with it.
+    '''
+    def __init__(self):
+        self._tail = b''
+        self._title = None  # bytearray once inside the title
+        self._searched = 0  # title offset the end-tag search can resume from
+        self.title_bytes = None
+        self.bytes_read = 0
+        self.meta_charset = None
+        self._head = b''  # the first bytes, to spot a byte order mark
+        self._bom_charset = None
+
+    @property
+    def done(self):
+        return self.title_bytes is not None
+
+    def feed(self, chunk):
+        if self.done:
+            return True
+        if len(self._head) < len(_UTF8_BOM):
+            self._head += bytes(chunk[:len(_UTF8_BOM) - len(self._head)])
+            if self._head == _UTF8_BOM:
+                self._bom_charset = 'utf-8'
+        self.bytes_read += len(chunk)
+        if self._title is None:
+            data = self._tail + chunk if self._tail else chunk
+            if self.meta_charset is None:
+                meta = _META_CHARSET.search(data)
+                if meta is not None:
+                    self.meta_charset = meta.group(1).decode('ascii')
+            start = _TITLE_START.search(data)
+            if start is None:
+                # keep a possible partial tag (or meta) for the next chunk
+                open_tag = _OPEN_TAG.search(data)
+                keep = open_tag is not None and len(data) - open_tag.start() <= _MAX_TAIL
+                self._tail = bytes(data[open_tag.start():]) if keep else b''
+                return False
+            self._tail = b''
+            self._title = bytearray(data[start.end():])
+        else:
+            self._title += chunk
+        title = self._title
+        end = _TITLE_END.search(title, self._searched)
+        if end is None:
+            if len(title) <= _MAX_TITLE:
+                # an end tag may be split across chunks, so look back a little
+                self._searched = max(0, len(title) - 64)
+                return False
+            end_pos = _MAX_TITLE  # not a real title; keep what fits
+        else:
+            end_pos = end.start()
+        self.title_bytes = bytes(title[:end_pos])
+        self._title = None
+        return True
+
+    def title(self, encoding=None):
+        '''The decoded, entity-unescaped title, or None if none was found.
+
+        The charset is chosen as browsers do: a byte order mark, then
+        encoding (the charset declared in the HTTP headers), then the meta
+        charset, then UTF-8.
+        '''
+        if self.title_bytes is None:
+            return None
+        charset = self._bom_charset or encoding or self.meta_charset or 'utf-8'
+        try:
+            codecs.lookup(charset)
+        except LookupError:
+            charset = 'utf-8'
+        text = html.unescape(self.title_bytes.decode(charset, errors='replace'))
+        # browsers collapse whitespace in titles
+        return ' '.join(text.split())
+
+
+def header_charset(content_type):
+    '''The charset declared in a Content-Type header value, if any.'''
+    match = _HEADER_CHARSET.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def extract_title(data, encoding=None):
+    '''The title of an HTML document held in memory (bytes or memoryview).'''
+    scanner = TitleScanner()
+    scanner.feed(data)
+    return scanner.title(encoding)
+
+
+TitleResult = namedtuple('TitleResult', 'title bytes_read page_size')
+
+
+def fetch_title(url, session=None, chunk_size=CHUNK_SIZE, timeout=10, drain=0):
+    '''Stream url and return a TitleResult as soon as </title> is seen.
+
+    The response is closed right away, so the rest of the body is never
+    downloaded. bytes_read counts the body bytes received over the wire
+    and page_size is the Content-Length, if the server sent one; both are
+    before content decoding, so with gzip (which requests asks for) they
+    are compressed sizes.
+
+    Closing a response early also drops its connection. If no more than
+    drain bytes of the body are left, they are read instead, so that a
+    pooled session can reuse the connection (keep-alive).
+    '''
+    get = (session or requests).get
+    scanner = TitleScanner()
+    with get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        length = response.headers.get('Content-Length')
+        chunks = response.iter_content(chunk_size)
+        for chunk in chunks:
+            if scanner.feed(chunk):
+                break
+        # raw.tell() counts encoded bytes, like Content-Length; the
+        # scanner's count is of decoded ones
+        if length is not None and int(length) - response.raw.tell() <= drain:
+            for _ in chunks:
+                pass
+        bytes_read = response.raw.tell()
+        # not response.encoding: requests falls back to ISO-8859-1 for
+        # text/html without a charset, which would override the meta charset
+        encoding = header_charset(response.headers.get('Content-Type'))
+    return TitleResult(
+        scanner.title(encoding),
+        bytes_read,
+        int(length) if length is not None else None,
+    )
+
+
+BatchResult = namedtuple('BatchResult', 'url result error')
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def make_session(per_host=8, retries=3, backoff=0.2):
+    '''A requests.Session for bulk fetching.
+
+    Connections are kept alive and pooled per host, with at most per_host
+    open to any one host; extra requests to that host wait for a free
+    connection (pool_block). Connection errors and RETRY_STATUSES are
+    retried with exponential backoff.
+    '''
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=64,  # hosts whose pools are kept
+        pool_maxsize=per_host,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_titles(urls, concurrency=16, session=None, per_host=8, timeout=(3.05, 10),
+                 retries=3, drain=64 * 1024):
+    '''Fetch the titles of many pages concurrently; yields a BatchResult
+    (url, TitleResult or None, exception or None) per URL in completion order.
+
+    urls may be any iterable, including a generator: no more than
+    2 * concurrency requests are queued at a time. A pooled session from
+    make_session(per_host, retries) is used unless one is given.
+    timeout is requests' (connect, read) timeout per request.
+    '''
+    own_session = session is None
+    if own_session:
+        session = make_session(per_host, retries)
+    urls = iter(urls)
+    pool = ThreadPoolExecutor(concurrency)
+    pending = {}
+
+    def submit_more():
+        for page in islice(urls, 2 * concurrency - len(pending)):
+            future = pool.submit(fetch_title, page, session, timeout=timeout, drain=drain)
+            pending[future] = page
+
+    try:
+        submit_more()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = pending.pop(future)
+                error = future.exception()
+                yield BatchResult(page, None if error else future.result(), error)
+            submit_more()
+    finally:
+        # the caller may stop iterating early
+        pool.shutdown(wait=True, cancel_futures=True)
+        if own_session:
+            session.close()
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real server
+    # otherwise small writes on a kept-alive connection stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = self.server.pages.get(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if body is None:
+            self.send_error(404)
+            return
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped and self.server.compressed is not None:
+            body = self.server.compressed[self.path]
+        else:
+            gzipped = False
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        for i in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[i:i + CHUNK_SIZE])
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading early, as intended
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default listen backlog of 5 drops bursts
+
+
+@contextmanager
+def serve(pages, latency=0, compress=False):
+    '''Serve {path: html bytes} on a local port; yields the base URL.
+
+    A stand-in for the real site when trying out or benchmarking the
+    fetchers without network access. latency (seconds) delays every
+    response, like a remote server would. With compress, pages are sent
+    gzip-encoded to clients that accept it, as Wikipedia does.
+    '''
+    server = _StandInServer(('127.0.0.1', 0), _PageHandler)
+    server.pages = pages
+    server.latency = latency
+    server.compressed = (
+        {path: gzip.compress(body) for path, body in pages.items()} if compress else None
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+_WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+    'incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud '
+    'exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute irure '
+    'in reprehenderit voluptate velit esse cillum fugiat nulla pariatur excepteur sint '
+    'occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim id est'
+).split()
+
+
+def sample_page(title, size=800_000):
+    '''An HTML page of about size bytes with title near the top, like a
+    Wikipedia article.'''
+    head = f'<!DOCTYPE html>\n<html><head><meta charset="UTF-8">\n<title>{title}</title>\n'
+    # varied text, so that the page compresses about as well as a real one
+    rng = random.Random(size)
+    paragraphs = []
+    length = len(head)
+    while length < size:
+        paragraph = '<p>' + ' '.join(rng.choices(_WORDS, k=120)) + '.</p>\n'
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return (head + '</head><body>\n' + ''.join(paragraphs) + '</body></html>\n').encode()
+
+
+def demo():
+    title = 'John von Neumann - Wikipedia'
+    body = sample_page(title)
+    start = time.perf_counter()
+    for _ in range(100):
+        text = body.decode('utf-8')
+        text[text.find('<title>') + len('<title>'):text.find('</title>')]
+    decoded = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    for _ in range(100):
+        extract_title(memoryview(body))
+    scanned = (time.perf_counter() - start) / 100
+    print(f'in memory: decode + str.find {decoded * 1e6:7.1f} us, '
+          f'extract_title {scanned * 1e6:7.1f} us')
+
+    for compress in (False, True):
+        with serve({'/wiki/John_von_Neumann': body}, compress=compress) as base:
+            page = base + '/wiki/John_von_Neumann'
+            start = time.perf_counter()
+            assert get_title(page) == title
+            full = time.perf_counter() - start
+            start = time.perf_counter()
+            result = fetch_title(page)
+            streamed = time.perf_counter() - start
+        assert result.title == title
+        print('gzip:' if compress else 'identity:')
+        print(f'  get_title:   {full * 1e3:7.1f} ms, {result.page_size:,} bytes read')
+        print(f'  fetch_title: {streamed * 1e3:7.1f} ms, {result.bytes_read:,} of '
+              f'{result.page_size:,} bytes read')
+
+
+def bench(n_pages=400, page_size=20_000, latency=0.02, concurrencies=(1, 2, 4, 8, 16, 32)):
+    '''pages/sec against the local stand-in (with latency seconds per
+    response): serial get_title() with a new connection per page, then
+    fetch_titles() as concurrency goes up.'''
+    titles = {f'/wiki/Page_{i}': f'Page {i}' for i in range(n_pages)}
+    pages = {path: sample_page(title, page_size) for path, title in titles.items()}
+    print(f'{n_pages} pages of {page_size:,} bytes, {latency * 1e3:.0f} ms server latency')
+    with serve(pages, latency) as base:
+        urls = [base + path for path in pages]
+        serial = urls[:50]
+        start = time.perf_counter()
+        for page in serial:
+            get_title(page)
+        elapsed = time.perf_counter() - start
+        print(f'serial get_title       {len(serial) / elapsed:8,.0f} pages/sec')
+        for concurrency in concurrencies:
+            start = time.perf_counter()
+            results = list(fetch_titles(urls, concurrency, per_host=concurrency))
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for result in results if result.error)
+            assert all(
+                result.result.title == titles[result.url[len(base):]]
+                for result in results if not result.error
+            )
+            print(f'fetch_titles, {concurrency:>2} threads {n_pages / elapsed:8,.0f} pages/sec'
+                  f'{f", {failed} failed" if failed else ""}')
+
+
+if __name__ == '__main__':
+    if '--live' in sys.argv:
+        print(fetch_title(url))
+    elif '--bench' in sys.argv:
+        bench()
+    else:
+        demo()
@@ -0,0 +1,166 @@
+'''
+Append-only, memory-mapped ledger storage for Account.
+
+Every ledger entry is written as a fixed-width 24 byte record (epoch
+nanoseconds, value and balance in minor units, all int64) to the end of a
+file. Reads go through mmap and only unpack the records actually asked
+for, so opening an account with millions of entries is constant time and
+slicing acct.ledger reads straight from the mapped pages:
+
+    acct = Account('John', 'Smith', '123456',
+                   ledger_storage=FileLedger('123456.ledger', currency='USD'))
+'''
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from solutions import LedgerEntry, get_currency
+
+
+_MAGIC = b'LEDG'
+# version 1 stored epoch microseconds, version 2 a fixed-point scale
+_VERSION = 3
+_HEADER = struct.Struct('<4sI8s')  # magic, version, currency code
+_RECORD = struct.Struct('<qqq')  # epoch ns, value, balance
+
+
+class FileLedger:
+    '''Ledger storage backed by an append-only file of fixed-width records.'''
+
+    def __init__(self, path, currency='USD'):
+        currency = get_currency(currency)
+        self._path = path
+        # not 'a+b': appends must go to the end of the last whole record,
+        # which is not the end of the file after a torn write
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o666), 'r+b', buffering=0)
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            self._file.write(_HEADER.pack(_MAGIC, _VERSION, currency.code.encode()))
+            size = _HEADER.size
+        else:
+            header = self._file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                self._file.close()
+                raise ValueError(f'{path} is not a ledger file (truncated header).')
+            magic, version, code = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                self._file.close()
+                raise ValueError(f'{path} is not a ledger file.')
+            code = code.rstrip(b'\0').decode()
+            if code != currency.code:
+                self._file.close()
+                raise ValueError(f'{path} is in {code}, not {currency.code}.')
+        self._count = (size - _HEADER.size) // _RECORD.size
+        end = _HEADER.size + self._count * _RECORD.size
+        if size > end:
+            # drop a torn final record (e.g. after a crash mid-write), so
+            # that the next record is written where it belongs
+            self._file.truncate(end)
+        self._currency = currency
+        self._map = None
+
+    @classmethod
+    def factory(cls, directory):
+        '''Storage for ledger_io readers: <directory>/<account number>.ledger.'''
+        return _FileLedgerFactory(cls, directory)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def currency(self):
+        return self._currency
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _pack(self, entry):
+        if entry.currency is not self._currency:
+            raise ValueError(f'Ledger entries must be in {self._currency.code}.')
+        return _RECORD.pack(entry.ns, entry.units, entry.balance_units)
+
+    def _write(self, data, count):
+        self._file.seek(_HEADER.size + self._count * _RECORD.size)
+        self._file.write(data)
+        self._count += count
+
+    def append(self, entry):
+        self._write(self._pack(entry), 1)
+
+    def extend(self, entries):
+        data = b''.join(self._pack(entry) for entry in entries)
+        self._write(data, len(data) // _RECORD.size)
+
+    def flush(self):
+        os.fsync(self._file.fileno())
+
+    def __len__(self):
+        return self._count
+
+    def _mapped(self):
+        needed = _HEADER.size + self._count * _RECORD.size
+        if self._map is None or len(self._map) < needed:
+            # the file has grown since it was mapped
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), needed, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('ledger index out of range')
+        ns, value, balance = _RECORD.unpack_from(
+            self._mapped(), _HEADER.size + index * _RECORD.size
+        )
+        return LedgerEntry(ns, value, balance, self._currency)
+
+    def columns(self, start=0, stop=None):
+        '''(times, values, balances) int64 arrays for entries start:stop.'''
+        start, stop, _ = slice(start, stop).indices(self._count)
+        stop = max(start, stop)
+        offset = _HEADER.size + start * _RECORD.size
+        with memoryview(self._mapped()) as mapped:
+            with mapped[offset:offset + (stop - start) * _RECORD.size].cast('q') as records:
+                # records interleave the three fields; strided slices split them
+                result = tuple(array('q', records[i::3].tobytes()) for i in range(3))
+        if sys.byteorder == 'big':
+            for column in result:
+                column.byteswap()
+        return result
+
+    def __iter__(self):
+        # unpack record by record rather than slicing the map, which would
+        # copy the whole history
+        unpack_from = _RECORD.unpack_from
+        currency = self._currency
+        for index in range(self._count):
+            ns, value, balance = unpack_from(
+                self._mapped(), _HEADER.size + index * _RECORD.size
+            )
+            yield LedgerEntry(ns, value, balance, currency)
+
+
+class _FileLedgerFactory:
+    __slots__ = ('_cls', '_directory')
+
+    def __init__(self, cls, directory):
+        self._cls = cls
+        self._directory = directory
+
+    def storage_for(self, account_number, currency):
+        path = os.path.join(self._directory, f'{account_number}.ledger')
+        return self._cls(path, currency)
@@ -0,0 +1,266 @@
+'''
+Streaming export and import of account ledgers.
+
+Ledgers are written chunk by chunk, so memory use is bounded by the chunk
+size rather than the history length, in one of two formats:
+
+CSV, one row per ledger entry with the account details repeated on each
+row (timestamps are epoch nanoseconds, amounts are decimal strings):
+
+    write_csv(accounts, 'statements.csv')
+    for acct in read_csv('statements.csv'):
+        ...
+
+and a columnar binary format, where each chunk stores its timestamps,
+values and balances as three contiguous int64 columns that are copied in
+and out of arrays without building per-entry objects:
+
+    write_columns(accounts, 'ledgers.bin')
+    for acct in read_columns('ledgers.bin', storage=ColumnarLedger):
+        ...
+
+The readers are generators that yield each Account as soon as its rows
+have been read. storage makes the ledger storage of each imported account
+(a list by default): a ledger class taking the Currency, such as
+ColumnarLedger, or anything with a storage_for(account_number, currency)
+method. FileLedger needs a path per account, so use its factory:
+
+    read_columns('ledgers.bin', storage=FileLedger.factory('ledgers/'))
+
+Either keeps the whole input out of memory.
+'''
+import csv
+import json
+import struct
+import sys
+from array import array
+from itertools import islice
+
+from solutions import Account, LedgerEntry, get_currency
+
+
+CHUNK_SIZE = 65_536
+
+CSV_FIELDS = (
+    'account_number', 'first_name', 'last_name', 'is_overdraft_allowed',
+    'currency', 'timestamp_ns', 'value', 'balance',
+)
+
+_MAGIC = b'LDGC'
+_VERSION = 1
+_HEADER = struct.Struct('<4sI')  # magic, version
+# length of the account metadata (0 if this chunk continues the previous
+# account), then the number of entries in the chunk
+_CHUNK = struct.Struct('<IQ')
+
+
+def _column_chunks(account, chunk_size):
+    '''Yield the account's ledger as (times, values, balances) int64 arrays.'''
+    storage = account._ledger
+    total = len(storage)
+    columns = getattr(storage, 'columns', None)
+    if columns is not None:
+        for start in range(0, total, chunk_size):
+            yield columns(start, start + chunk_size)
+        return
+    entries = iter(storage)
+    for _ in range(0, total, chunk_size):
+        chunk = list(islice(entries, chunk_size))
+        yield (
+            array('q', [entry.ns for entry in chunk]),
+            array('q', [entry.units for entry in chunk]),
+            array('q', [entry.balance_units for entry in chunk]),
+        )
+
+
+def _formatter(currency):
+    '''A function formatting minor units as a decimal string, like str(Money).'''
+    exponent = currency.exponent
+    if not exponent:
+        return str
+    factor = currency.factor
+
+    def format_units(units):
+        whole, frac = divmod(abs(units), factor)
+        return f'{"-" if units < 0 else ""}{whole}.{frac:0{exponent}d}'
+    return format_units
+
+
+def _parser(currency):
+    '''A function parsing _formatter() output back to minor units.'''
+    exponent = currency.exponent
+    to_units = currency.to_units
+
+    def parse_units(text):
+        whole, _, frac = text.partition('.')
+        if len(frac) == exponent:
+            return int(whole + frac)  # '-0.50' -> -50
+        return to_units(text)
+    return parse_units
+
+
+def _account_info(account):
+    return {
+        'account_number': account.account_number,
+        'first_name': account.first_name,
+        'last_name': account.last_name,
+        'is_overdraft_allowed': account.is_overdraft_allowed,
+        'currency': account.currency.code,
+    }
+
+
+def _new_storage(storage, account_number, currency):
+    if storage is None:
+        return []
+    storage_for = getattr(storage, 'storage_for', None)
+    if storage_for is not None:
+        return storage_for(account_number, currency)
+    return storage(currency)
+
+
+def _new_account(info, storage, thread_safe):
+    return Account(
+        info['first_name'],
+        info['last_name'],
+        info['account_number'],
+        is_overdraft_allowed=info['is_overdraft_allowed'],
+        ledger_storage=storage,
+        thread_safe=thread_safe,
+        currency=info['currency']
+    )
+
+
+def write_csv(accounts, path, chunk_size=CHUNK_SIZE):
+    '''Write every account's ledger to a CSV file; returns the row count.'''
+    rows = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for account in accounts:
+            info = _account_info(account)
+            prefix = (
+                info['account_number'], info['first_name'], info['last_name'],
+                int(info['is_overdraft_allowed']), info['currency'],
+            )
+            fmt = _formatter(account.currency)
+            with account._lock:
+                for times, values, balances in _column_chunks(account, chunk_size):
+                    writer.writerows(
+                        prefix + (ns, fmt(value), fmt(balance))
+                        for ns, value, balance in zip(times, values, balances)
+                    )
+                    rows += len(times)
+    return rows
+
+
+def read_csv(path, storage=None, thread_safe=False):
+    '''Yield Accounts from a file written by write_csv(), one at a time.
+
+    Each account's rows must be contiguous, as write_csv() writes them.
+    '''
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if tuple(header) != CSV_FIELDS:
+            raise ValueError(f'{path} is not a ledger CSV file.')
+        info = ledger = None
+        chunk = []
+        for row in reader:
+            number = row[0]
+            if info is None or number != info['account_number']:
+                if info is not None:
+                    ledger.extend(chunk)
+                    yield _new_account(info, ledger, thread_safe)
+                currency = get_currency(row[4])
+                parse = _parser(currency)
+                info = {
+                    'account_number': number,
+                    'first_name': row[1],
+                    'last_name': row[2],
+                    'is_overdraft_allowed': row[3] == '1',
+                    'currency': currency,
+                }
+                ledger = _new_storage(storage, number, currency)
+                chunk = []
+            chunk.append(
+                LedgerEntry(int(row[5]), parse(row[6]), parse(row[7]), currency)
+            )
+            if len(chunk) >= CHUNK_SIZE:
+                ledger.extend(chunk)
+                chunk = []
+        if info is not None:
+            ledger.extend(chunk)
+            yield _new_account(info, ledger, thread_safe)
+
+
+def _write_column(f, column):
+    if sys.byteorder == 'big':
+        column = array('q', column)
+        column.byteswap()
+    column.tofile(f)
+
+
+def _read_column(f, count):
+    column = array('q')
+    column.fromfile(f, count)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def write_columns(accounts, path, chunk_size=CHUNK_SIZE):
+    '''Write every account's ledger to a columnar binary file; returns the
+    number of entries written.'''
+    rows = 0
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION))
+        for account in accounts:
+            meta = json.dumps(_account_info(account)).encode()
+            with account._lock:
+                for times, values, balances in _column_chunks(account, chunk_size):
+                    f.write(_CHUNK.pack(len(meta), len(times)))
+                    f.write(meta)
+                    meta = b''  # later chunks continue the same account
+                    for column in (times, values, balances):
+                        _write_column(f, column)
+                    rows += len(times)
+    return rows
+
+
+def read_columns(path, storage=None, thread_safe=False):
+    '''Yield Accounts from a file written by write_columns(), one at a time.
+
+    Storage with an extend_columns() method (such as ColumnarLedger) is
+    filled straight from the columns.
+    '''
+    with open(path, 'rb') as f:
+        magic, version = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'{path} is not a columnar ledger file.')
+        info = ledger = None
+        while True:
+            header = f.read(_CHUNK.size)
+            if not header:
+                break
+            meta_size, count = _CHUNK.unpack(header)
+            if meta_size:
+                if info is not None:
+                    yield _new_account(info, ledger, thread_safe)
+                info = json.loads(f.read(meta_size))
+                currency = info['currency'] = get_currency(info['currency'])
+                ledger = _new_storage(storage, info['account_number'], currency)
+                extend_columns = getattr(ledger, 'extend_columns', None)
+            elif info is None:
+                raise ValueError(f'{path} is corrupt: chunk without an account.')
+            times, values, balances = (_read_column(f, count) for _ in range(3))
+            if extend_columns is not None:
+                extend_columns(times, values, balances)
+            else:
+                ledger.extend(
+                    LedgerEntry(t, v, b, currency)
+                    for t, v, b in zip(times, values, balances)
+                )
+        if info is not None:
+            yield _new_account(info, ledger, thread_safe)
@@ -222,8 +222,8 @@ to cover the debit if overdrafts are not allowed. If not, we'll want to raise a
 Let's define that custom exception first:
 
 class OverdraftNotAllowed(Exception):
-    '''Exception indicating a transaction would have resulted in a forbidden
-overdraft.'''
+    """Exception indicating a transaction would have resulted in a forbidden
+overdraft."""
 Since both credits and debits will write the same thing to the same ledger 
 (assuming the transaction goes through), we'll have some common code to add 
 the entry to the ledger - so we'll write that as a "private" method we can use 
@@ -771,4 +771,1476 @@ a1 == a2
 False
 As you can see equality is based solely on the account number and seems to 
 work properly.
-'''
\ No newline at end of file
+'''
+
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict, deque
+from collections.abc import Sequence
+from contextlib import ExitStack, nullcontext
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from enum import IntEnum
+from fractions import Fraction
+from itertools import accumulate, islice
+from operator import eq, ge, gt, le, lt
+from threading import Lock, RLock, local
+import math
+import time
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NO_LOCK = nullcontext()
+
+
+def _to_ns(ts):
+    '''Epoch nanoseconds for an int (returned as is) or a datetime; naive
+    datetimes are taken to be UTC, as datetime.utcnow() used to produce.'''
+    if isinstance(ts, int):
+        return ts
+    if ts.tzinfo is None:
+        return (ts - _NAIVE_EPOCH) // _MICROSECOND * 1000
+    return (ts - _EPOCH) // _MICROSECOND * 1000
+
+
+def _from_ns(ns):
+    '''Timezone-aware UTC datetime for epoch nanoseconds (to the microsecond).'''
+    return _EPOCH + timedelta(microseconds=ns // 1000)
+
+
+def _to_ns_delta(delta):
+    if isinstance(delta, timedelta):
+        return delta // _MICROSECOND * 1000
+    return delta
+
+
+class CoarseClock:
+    '''Default clock: integer epoch nanoseconds that never go backwards.
+
+    Reads a monotonic clock (the cheap coarse variant where the platform has
+    one) and adds a wall-clock offset captured once at creation, so stamps
+    are both fast to take and comparable with real time.
+    '''
+    __slots__ = ('_read', '_offset')
+
+    def __init__(self):
+        clock_id = getattr(time, 'CLOCK_MONOTONIC_COARSE', None)
+        if clock_id is not None:
+            self._read = lambda: time.clock_gettime_ns(clock_id)
+        else:
+            self._read = time.monotonic_ns
+        self._offset = time.time_ns() - self._read()
+
+    def now(self):
+        return self._read() + self._offset
+
+
+class FrozenClock:
+    '''Deterministic clock for tests and replays.
+
+    Always returns the same stamp until moved with advance() or set();
+    with step, every read moves the clock forward by that much afterwards.
+    '''
+    __slots__ = ('_ns', '_step')
+
+    def __init__(self, start=0, step=0):
+        self._ns = _to_ns(start)
+        self._step = _to_ns_delta(step)
+
+    def now(self):
+        ns = self._ns
+        self._ns += self._step
+        return ns
+
+    def advance(self, delta):
+        self._ns += _to_ns_delta(delta)
+
+    def set(self, ts):
+        self._ns = _to_ns(ts)
+
+
+class BatchClock:
+    '''Wraps another clock so a whole batch of calls shares one reading.
+
+        clock = BatchClock(CoarseClock())
+        acct = Account('f', 'l', '1', clock=clock)
+        with clock.batch():
+            for value in values:
+                acct.deposit(value)   # one underlying clock read in total
+
+    Outside a batch() block it simply delegates. Batches are per thread.
+    '''
+    __slots__ = ('_clock', '_state')
+
+    def __init__(self, clock=None):
+        self._clock = CoarseClock() if clock is None else clock
+        self._state = local()
+
+    def now(self):
+        ns = getattr(self._state, 'ns', None)
+        if ns is None:
+            return self._clock.now()
+        return ns
+
+    def batch(self):
+        return _ClockBatch(self)
+
+
+class _ClockBatch:
+    __slots__ = ('_clock', '_previous')
+
+    def __init__(self, clock):
+        self._clock = clock
+
+    def __enter__(self):
+        state = self._clock._state
+        self._previous = getattr(state, 'ns', None)
+        if self._previous is None:
+            state.ns = self._clock._clock.now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._clock._state.ns = self._previous
+
+
+DEFAULT_CLOCK = CoarseClock()
+
+
+class Currency:
+    '''A currency code and the number of decimal places of its minor unit.'''
+    __slots__ = ('_code', '_exponent', '_factor')
+
+    def __init__(self, code, exponent):
+        if not isinstance(exponent, int) or exponent < 0:
+            raise ValueError('Exponent must be a non-negative int.')
+        self._code = code
+        self._exponent = exponent
+        self._factor = 10 ** exponent
+
+    @property
+    def code(self):
+        return self._code
+
+    @property
+    def exponent(self):
+        return self._exponent
+
+    @property
+    def factor(self):
+        return self._factor
+
+    def to_units(self, amount):
+        '''Exact number of minor units in amount.
+
+        Accepts Money in this currency, ints, Decimals, strings and floats
+        (taken as written, e.g. 0.1 is 10 cents); raises ValueError if the
+        amount has more decimal places than the currency allows.
+        '''
+        if type(amount) is int:
+            return amount * self._factor
+        if isinstance(amount, Money):
+            if amount._currency is not self:
+                raise ValueError(f'Cannot mix {amount._currency.code} and {self._code}.')
+            return amount._units
+        if isinstance(amount, float):
+            amount = repr(amount)
+        try:
+            scaled = Decimal(amount).scaleb(self._exponent)
+        except ArithmeticError:
+            raise ValueError(f'Invalid amount {amount!r}.') from None
+        if not scaled.is_finite():
+            raise ValueError(f'Invalid amount {amount!r}.')
+        if scaled != scaled.to_integral_value():
+            raise ValueError(
+                f'{amount} has more than {self._exponent} decimal places for {self._code}.'
+            )
+        return int(scaled)
+
+    def money(self, units):
+        return Money.from_units(units, self)
+
+    def __repr__(self):
+        return f'Currency({self._code!r}, {self._exponent})'
+
+
+CURRENCIES = {
+    code: Currency(code, exponent)
+    for code, exponent in (
+        ('USD', 2), ('EUR', 2), ('GBP', 2), ('CAD', 2), ('AUD', 2), ('CHF', 2),
+        ('CNY', 2), ('INR', 2), ('JPY', 0), ('KRW', 0), ('BHD', 3), ('KWD', 3),
+    )
+}
+
+
+def get_currency(currency):
+    '''The Currency for a code such as 'USD' (Currency objects pass through).'''
+    if isinstance(currency, Currency):
+        return currency
+    try:
+        return CURRENCIES[currency]
+    except KeyError:
+        raise ValueError(f'Unknown currency {currency!r}.') from None
+
+
+class Money:
+    '''An exact amount held as an integer number of minor units (e.g. cents).
+
+    Money(amount, currency) takes an amount, as Currency.to_units() does:
+    Money(5) is five dollars; Money.from_units(5) is five cents.
+    Arithmetic and comparisons are integer operations; the amount is only
+    formatted as a decimal by __str__ and __repr__. Comparisons with plain
+    numbers are exact, as with Decimal: Money('0.10', 'USD') == Decimal('0.1')
+    but != 0.1, which is not exactly one tenth as a float. Amounts in
+    different currencies are never equal, and cannot be ordered or mixed
+    in arithmetic.
+    '''
+    __slots__ = ('_units', '_currency')
+
+    def __init__(self, amount, currency='USD'):
+        self._currency = get_currency(currency)
+        self._units = self._currency.to_units(amount)
+
+    @classmethod
+    def from_units(cls, units, currency='USD'):
+        '''Money for an int number of minor units, e.g. cents.'''
+        if type(units) is not int:
+            raise TypeError(f'Minor units must be an int, not {type(units).__name__}.')
+        return cls._make(units, get_currency(currency))
+
+    @classmethod
+    def _make(cls, units, currency):
+        money = object.__new__(cls)
+        money._units = units
+        money._currency = currency
+        return money
+
+    @property
+    def units(self):
+        return self._units
+
+    @property
+    def currency(self):
+        return self._currency
+
+    def _other_units(self, other):
+        if isinstance(other, Money):
+            if other._currency is not self._currency:
+                raise ValueError(
+                    f'Cannot mix {self._currency.code} and {other._currency.code}.'
+                )
+            return other._units
+        return self._currency.to_units(other)
+
+    def __add__(self, other):
+        if type(other) is Money and other._currency is self._currency:
+            # fast path for the common case; skips _make's extra call
+            money = object.__new__(Money)
+            money._units = self._units + other._units
+            money._currency = self._currency
+            return money
+        try:
+            return Money._make(self._units + self._other_units(other), self._currency)
+        except TypeError:
+            return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        try:
+            return Money._make(self._units - self._other_units(other), self._currency)
+        except TypeError:
+            return NotImplemented
+
+    def __rsub__(self, other):
+        try:
+            return Money._make(self._other_units(other) - self._units, self._currency)
+        except TypeError:
+            return NotImplemented
+
+    def __mul__(self, other):
+        if type(other) is not int:
+            return NotImplemented
+        return Money._make(self._units * other, self._currency)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money._make(-self._units, self._currency)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Money._make(abs(self._units), self._currency)
+
+    def __bool__(self):
+        return self._units != 0
+
+    def _fraction(self):
+        return Fraction(self._units, self._currency._factor)
+
+    def _compare(self, other, op):
+        if isinstance(other, Money):
+            return op(self._units, self._other_units(other))
+        if type(other) is int:
+            return op(self._units, other * self._currency._factor)
+        if isinstance(other, (float, Decimal, Fraction)):
+            return op(self._fraction(), other)
+        return NotImplemented
+
+    def __eq__(self, other):
+        if isinstance(other, Money) and other._currency is not self._currency:
+            return False
+        return self._compare(other, eq)
+
+    def __lt__(self, other):
+        return self._compare(other, lt)
+
+    def __le__(self, other):
+        return self._compare(other, le)
+
+    def __gt__(self, other):
+        return self._compare(other, gt)
+
+    def __ge__(self, other):
+        return self._compare(other, ge)
+
+    def __hash__(self):
+        # equal numbers must hash equal, e.g. Money('5.00', 'USD') and 5
+        return hash(self._fraction())
+
+    def __float__(self):
+        return self._units / self._currency._factor
+
+    def to_decimal(self):
+        return Decimal(self._units).scaleb(-self._currency._exponent)
+
+    def __str__(self):
+        exponent = self._currency._exponent
+        if not exponent:
+            return str(self._units)
+        whole, frac = divmod(abs(self._units), self._currency._factor)
+        sign = '-' if self._units < 0 else ''
+        return f'{sign}{whole}.{frac:0{exponent}d}'
+
+    def __repr__(self):
+        return f'Money({str(self)!r}, {self._currency.code!r})'
+
+
+class OverdraftNotAllowed(Exception):
+    '''Exception indicating a transaction would have resulted in a forbidden
+overdraft.'''
+
+
+class WithdrawStatus(IntEnum):
+    '''Outcome of Account.try_withdraw(); OK is 0, like an exit status.'''
+    OK = 0
+    INVALID = 1  # not a positive amount in the account's currency
+    OVERDRAFT = 2  # would result in a forbidden overdraft
+
+
+class BatchOverdraftNotAllowed(OverdraftNotAllowed):
+    '''OverdraftNotAllowed raised by a batch operation.
+
+    index is the position of the first transaction in the batch that would
+    have resulted in a forbidden overdraft.
+    '''
+    def __init__(self, message, index):
+        super().__init__(message)
+        self.index = index
+
+
+class LedgerEntry:
+    '''A single ledger record: timestamp, signed value and running balance.
+
+    Uses __slots__ so an entry, currency included, is no bigger than an
+    (ns, value, balance) tuple (64 bytes on CPython), while still unpacking
+    and indexing like one: dt, value, balance = entry.
+    The timestamp is kept as integer epoch nanoseconds (ns); dt converts it
+    to a timezone-aware UTC datetime only when asked for. Likewise, with a
+    currency the value and balance are stored as integer minor units and
+    only wrapped as Money when read.
+    '''
+    __slots__ = ('_ns', '_value', '_balance', '_currency')
+
+    def __init__(self, ts, value, balance, currency=None):
+        self._ns = ts if type(ts) is int else _to_ns(ts)
+        self._value = value
+        self._balance = balance
+        self._currency = currency
+
+    @property
+    def ns(self):
+        return self._ns
+
+    @property
+    def dt(self):
+        return _from_ns(self._ns)
+
+    @property
+    def currency(self):
+        return self._currency
+
+    @property
+    def units(self):
+        '''The value as stored (minor units when there is a currency).'''
+        return self._value
+
+    @property
+    def balance_units(self):
+        return self._balance
+
+    @property
+    def value(self):
+        if self._currency is None:
+            return self._value
+        return Money._make(self._value, self._currency)
+
+    @property
+    def balance(self):
+        if self._currency is None:
+            return self._balance
+        return Money._make(self._balance, self._currency)
+
+    def __iter__(self):
+        yield self.dt
+        yield self.value
+        yield self.balance
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.dt, self.value, self.balance)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, LedgerEntry):
+            return (
+                self._ns == other._ns
+                and self._currency is other._currency
+                and self._value == other._value
+                and self._balance == other._balance
+            )
+        if isinstance(other, tuple):
+            return (self.dt, self.value, self.balance) == other
+        return NotImplemented
+
+    def __hash__(self):
+        # entries compare equal to their (dt, value, balance) tuple, so
+        # they must hash like it too
+        return hash((self.dt, self.value, self.balance))
+
+    def __repr__(self):
+        return f'LedgerEntry({self.dt!r}, {self.value!r}, {self.balance!r})'
+
+
+class LedgerView(Sequence):
+    '''Read-only view over an account's ledger storage.
+
+    Unlike tuple(self._ledger), building a view does not copy anything:
+    indexing, iteration and slicing all read the underlying storage directly.
+    Slicing returns another (narrower) view rather than a copy.
+    '''
+    __slots__ = ('_storage', '_range')
+
+    def __init__(self, storage, indices=None):
+        self._storage = storage
+        # None means "the whole storage", so the view tracks new entries
+        self._range = indices
+
+    def _indices(self):
+        if self._range is None:
+            return range(len(self._storage))
+        return self._range
+
+    def __len__(self):
+        if self._range is None:
+            return len(self._storage)
+        return len(self._range)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LedgerView(self._storage, self._indices()[index])
+        if self._range is None:
+            return self._storage[index]
+        return self._storage[self._range[index]]
+
+    def __iter__(self):
+        if self._range is None:
+            return iter(self._storage)
+        storage = self._storage
+        return (storage[i] for i in self._range)
+
+    def __reversed__(self):
+        storage = self._storage
+        return (storage[i] for i in reversed(self._indices()))
+
+    def __eq__(self, other):
+        if isinstance(other, (LedgerView, tuple)):
+            return len(self) == len(other) and all(
+                a == b for a, b in zip(self, other)
+            )
+        return NotImplemented
+
+    def __repr__(self):
+        return f'LedgerView({tuple(islice(self, 10))!r}, len={len(self)})'
+
+    def bisect_left(self, ts):
+        '''Index of the first entry whose timestamp is >= ts (a datetime or
+        epoch nanoseconds).'''
+        ns = _to_ns(ts)
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid].ns < ns:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def bisect_right(self, ts):
+        '''Index of the first entry whose timestamp is > ts.'''
+        ns = _to_ns(ts)
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ns < self[mid].ns:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+
+class ColumnarLedger:
+    '''Compact ledger storage backed by three int64 arrays.
+
+    Timestamps are kept as epoch nanoseconds and values/balances as integer
+    minor units of the ledger's currency, so each entry costs 24 bytes
+    instead of an object plus a boxed timestamp and two boxed numbers.
+    Entries are rebuilt as LedgerEntry records when read.
+    '''
+    __slots__ = ('_times', '_values', '_balances', '_currency')
+
+    def __init__(self, currency='USD'):
+        self._times = array('q')
+        self._values = array('q')
+        self._balances = array('q')
+        self._currency = get_currency(currency)
+
+    @classmethod
+    def from_columns(cls, times, values, balances, currency='USD'):
+        '''Build storage directly from epoch-nanosecond timestamps and
+        values/balances in minor units (e.g. int64 arrays).'''
+        ledger = cls(currency)
+        ledger.extend_columns(times, values, balances)
+        return ledger
+
+    @property
+    def currency(self):
+        return self._currency
+
+    def append(self, entry):
+        if entry.currency is not self._currency:
+            raise ValueError(f'Ledger entries must be in {self._currency.code}.')
+        self._times.append(entry.ns)
+        self._values.append(entry.units)
+        self._balances.append(entry.balance_units)
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def extend_columns(self, times, values, balances):
+        '''Append entries given as columns, without building LedgerEntry objects.'''
+        if not len(times) == len(values) == len(balances):
+            raise ValueError('Columns must have the same length.')
+        self._times.extend(times)
+        self._values.extend(values)
+        self._balances.extend(balances)
+
+    def columns(self, start=0, stop=None):
+        '''Copies of the (times, values, balances) arrays for entries start:stop.'''
+        return (
+            self._times[start:stop],
+            self._values[start:stop],
+            self._balances[start:stop],
+        )
+
+    def __len__(self):
+        return len(self._times)
+
+    def __getitem__(self, index):
+        return LedgerEntry(
+            self._times[index],
+            self._values[index],
+            self._balances[index],
+            self._currency,
+        )
+
+    def __iter__(self):
+        for i in range(len(self._times)):
+            yield self[i]
+
+    def nbytes(self):
+        '''Bytes used by the three column buffers.'''
+        return sum(
+            col.buffer_info()[1] * col.itemsize
+            for col in (self._times, self._values, self._balances)
+        )
+
+
+class RollingTotal:
+    '''Sum of ledger values over a sliding time window.
+
+    Each value is added once and evicted once, so maintaining the total is
+    amortised O(1) per transaction.
+    '''
+    __slots__ = ('_window', '_window_ns', '_items', '_total', '_latest')
+
+    def __init__(self, window):
+        if not isinstance(window, timedelta) or window <= timedelta(0):
+            raise ValueError('Window must be a positive timedelta.')
+        self._window = window
+        self._window_ns = _to_ns_delta(window)
+        self._items = deque()
+        self._total = 0
+        self._latest = None  # timestamp of the last value added
+
+    @property
+    def window(self):
+        return self._window
+
+    def add(self, ts, amount):
+        ns = _to_ns(ts)
+        self._items.append((ns, amount))
+        self._total += amount
+        self._latest = ns
+        self._evict(ns)
+
+    def _evict(self, now_ns):
+        cutoff = now_ns - self._window_ns
+        items = self._items
+        while items and items[0][0] <= cutoff:
+            self._total -= items.popleft()[1]
+
+    def total(self, now=None):
+        '''Total over (now - window, now]; now should never go backwards.
+
+        now defaults to the time of the last value added. Reading a clock
+        here would cost a tick of a stepping clock such as FrozenClock.
+        '''
+        if now is not None:
+            self._evict(_to_ns(now))
+        elif self._latest is not None:
+            self._evict(self._latest)
+        return self._total
+
+
+class AccountStats:
+    '''Aggregates over an account's ledger, updated as entries are made.
+
+    Totals are kept in minor units and returned as Money. Rolling windows
+    are as of the last ledger entry unless given another time.
+    '''
+    __slots__ = (
+        '_ledger',
+        '_currency',
+        '_deposit_count',
+        '_withdrawal_count',
+        '_total_deposits',
+        '_total_withdrawals',
+        '_min_balance',
+        '_max_balance',
+        '_windows',
+    )
+
+    _KINDS = ('deposits', 'withdrawals')
+
+    def __init__(self, ledger, currency='USD'):
+        self._ledger = ledger
+        self._currency = get_currency(currency)
+        self._deposit_count = 0
+        self._withdrawal_count = 0
+        self._total_deposits = 0
+        self._total_withdrawals = 0
+        self._min_balance = None
+        self._max_balance = None
+        self._windows = {}
+
+    @property
+    def deposit_count(self):
+        return self._deposit_count
+
+    @property
+    def withdrawal_count(self):
+        return self._withdrawal_count
+
+    @property
+    def transaction_count(self):
+        return self._deposit_count + self._withdrawal_count
+
+    def _money(self, units):
+        return None if units is None else Money._make(units, self._currency)
+
+    @property
+    def total_deposits(self):
+        return self._money(self._total_deposits)
+
+    @property
+    def total_withdrawals(self):
+        '''Total withdrawn, as a positive amount.'''
+        return self._money(self._total_withdrawals)
+
+    @property
+    def min_balance(self):
+        return self._money(self._min_balance)
+
+    @property
+    def max_balance(self):
+        return self._money(self._max_balance)
+
+    def record(self, entry):
+        value = entry.units
+        balance = entry.balance_units
+        if value > 0:
+            self._deposit_count += 1
+            self._total_deposits += value
+        elif value < 0:
+            self._withdrawal_count += 1
+            self._total_withdrawals -= value
+        if self._min_balance is None or balance < self._min_balance:
+            self._min_balance = balance
+        if self._max_balance is None or balance > self._max_balance:
+            self._max_balance = balance
+        for kind, rolling in self._windows.values():
+            if kind == 'deposits' and value > 0:
+                rolling.add(entry.ns, value)
+            elif kind == 'withdrawals' and value < 0:
+                rolling.add(entry.ns, -value)
+
+    def record_many(self, entries):
+        for entry in entries:
+            self.record(entry)
+
+    def add_window(self, name, window, kind='withdrawals'):
+        '''Start tracking a rolling total of deposits or withdrawals.
+
+        Entries already in the ledger that fall inside the window are
+        included, found by binary search from the end of the ledger.
+        '''
+        if kind not in self._KINDS:
+            raise ValueError(f'Kind must be one of {self._KINDS}.')
+        rolling = RollingTotal(window)
+        ledger = LedgerView(self._ledger)
+        start = ledger.bisect_right(self._last_ns() - _to_ns_delta(window))
+        for entry in ledger[start:]:
+            if kind == 'deposits' and entry.units > 0:
+                rolling.add(entry.ns, entry.units)
+            elif kind == 'withdrawals' and entry.units < 0:
+                rolling.add(entry.ns, -entry.units)
+        self._windows[name] = (kind, rolling)
+
+    def remove_window(self, name):
+        del self._windows[name]
+
+    def _last_ns(self):
+        return self._ledger[-1].ns if len(self._ledger) else 0
+
+    def window_total(self, name, now=None):
+        '''Rolling total of window name as of now (default: the last entry).'''
+        if now is None:
+            now = self._last_ns()
+        return Money._make(self._windows[name][1].total(now), self._currency)
+
+    def __repr__(self):
+        return (
+            f'AccountStats(deposits: {self._deposit_count} / {self.total_deposits}, '
+            f'withdrawals: {self._withdrawal_count} / {self.total_withdrawals}, '
+            f'balance range: {self.min_balance}..{self.max_balance})'
+        )
+
+
+class Account:
+    __slots__ = (
+        '_first_name',
+        '_last_name',
+        '_account_number',
+        '_currency',
+        '_balance',
+        '_ledger',
+        '_is_overdraft_allowed',
+        '_listeners',
+        '_stats',
+        '_lock',
+        '_clock',
+    )
+
+    def __init__(
+        self,
+        first_name,
+        last_name,
+        account_number,
+        initial_balance=0,
+        is_overdraft_allowed=False,
+        ledger_storage=None,
+        thread_safe=False,
+        clock=None,
+        currency='USD'
+    ):
+        self._first_name = first_name
+        self._last_name = last_name
+        self._account_number = account_number
+        # balances and ledger values are kept as integer minor units (cents
+        # for USD) and only turned into Money at the public surface
+        self._currency = get_currency(currency)
+        # any object with append(), extend(), len() and integer indexing will do,
+        # e.g. ColumnarLedger for large in-memory histories or a FileLedger
+        self._ledger = [] if ledger_storage is None else ledger_storage
+        storage_currency = getattr(self._ledger, 'currency', self._currency)
+        if storage_currency is not self._currency:
+            raise ValueError(
+                f'Ledger storage is in {storage_currency.code}, not {self._currency.code}.'
+            )
+        self._listeners = ()  # becomes a list on the first add_listener()
+        # mutations run under this lock; a shared no-op context when the
+        # account is only ever used from one thread
+        self._lock = RLock() if thread_safe else _NO_LOCK
+        # anything with now() -> epoch nanoseconds, e.g. FrozenClock in tests
+        self._clock = DEFAULT_CLOCK if clock is None else clock
+        # built on first use, so reopening a long persisted history is cheap
+        self._stats = None
+        self.is_overdraft_allowed = is_overdraft_allowed
+        if len(self._ledger):
+            # resuming from existing history: initial_balance is ignored
+            self._balance = self._ledger[-1].balance_units
+        else:
+            self._balance = self._currency.to_units(initial_balance)
+            self._make_ledger_entry(0, self._balance)
+
+    @classmethod
+    def from_history(
+        cls,
+        first_name,
+        last_name,
+        account_number,
+        entries,
+        is_overdraft_allowed=False,
+        ledger_storage=None,
+        thread_safe=False,
+        clock=None,
+        currency='USD'
+    ):
+        '''Build an account whose ledger is exactly entries, in bulk.
+
+        entries are LedgerEntry records in the account's currency, or
+        (timestamp, value, balance) tuples with their original timestamps
+        (datetimes or epoch nanoseconds) and amounts; the balance is taken
+        from the last one. Nothing is re-validated.
+        '''
+        currency = get_currency(currency)
+        to_units = currency.to_units
+        storage = [] if ledger_storage is None else ledger_storage
+        storage.extend(
+            entry if isinstance(entry, LedgerEntry) and entry.currency is currency
+            else LedgerEntry(entry[0], to_units(entry[1]), to_units(entry[2]), currency)
+            for entry in entries
+        )
+        return cls(
+            first_name,
+            last_name,
+            account_number,
+            is_overdraft_allowed=is_overdraft_allowed,
+            ledger_storage=storage,
+            thread_safe=thread_safe,
+            clock=clock,
+            currency=currency
+        )
+
+    @property
+    def first_name(self):
+        return self._first_name
+
+    @property
+    def last_name(self):
+        return self._last_name
+
+    @property
+    def account_number(self):
+        return self._account_number
+
+    @property
+    def currency(self):
+        return self._currency
+
+    @property
+    def balance(self):
+        return Money._make(self._balance, self._currency)
+
+    @property
+    def ledger(self):
+        return LedgerView(self._ledger)
+
+    @property
+    def is_thread_safe(self):
+        return self._lock is not _NO_LOCK
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            with self._lock:
+                if self._stats is None:
+                    stats = AccountStats(self._ledger, self._currency)
+                    stats.record_many(self._ledger)
+                    self._stats = stats
+        return self._stats
+
+    @property
+    def is_overdraft_allowed(self):
+        return self._is_overdraft_allowed
+
+    @is_overdraft_allowed.setter
+    def is_overdraft_allowed(self, value):
+        if not isinstance(value, bool):
+            raise ValueError('Must be a bool.')
+        self._is_overdraft_allowed = value
+
+    def add_listener(self, listener):
+        '''Register listener(account, old_balance, entries) to be called after
+        every change to the balance, with the new ledger entries.'''
+        self._listeners = [*self._listeners, listener]
+
+    def remove_listener(self, listener):
+        listeners = list(self._listeners)
+        listeners.remove(listener)
+        self._listeners = listeners
+
+    def _notify(self, old_balance, entries):
+        old_balance = Money._make(old_balance, self._currency)
+        for listener in self._listeners:
+            listener(self, old_balance, entries)
+
+    def _make_ledger_entry(self, value, current_balance):
+        entry = LedgerEntry(self._clock.now(), value, current_balance, self._currency)
+        self._ledger.append(entry)
+        if self._stats is not None:
+            self._stats.record(entry)
+        return entry
+
+    def _make_ledger_entries(self, values, balances):
+        # the whole batch shares one clock reading
+        ns = self._clock.now()
+        currency = self._currency
+        entries = [
+            LedgerEntry(ns, value, balance, currency)
+            for value, balance in zip(values, balances)
+        ]
+        self._ledger.extend(entries)
+        if self._stats is not None:
+            self._stats.record_many(entries)
+        return entries
+
+    def balance_at(self, dt):
+        '''Balance as of dt (inclusive), found by binary search of the ledger.
+
+        dt may be an aware datetime, a naive one (taken as UTC) or epoch
+        nanoseconds.
+        '''
+        ledger = self.ledger
+        i = ledger.bisect_right(dt)
+        if i == 0:
+            raise ValueError(f'Account {self.account_number} did not exist at {dt}.')
+        return ledger[i - 1].balance
+
+    def transactions_between(self, start, end):
+        '''Ledger entries with start <= timestamp < end, as a LedgerView.'''
+        ledger = self.ledger
+        return ledger[ledger.bisect_left(start):ledger.bisect_left(end)]
+
+    def deposit(self, value):
+        value = self._currency.to_units(value)
+        if value <= 0:
+            raise ValueError('Deposit value must be positive')
+        with self._lock:
+            old_balance = self._balance
+            self._balance += value
+            entry = self._make_ledger_entry(value, self._balance)
+            if self._listeners:
+                self._notify(old_balance, (entry,))
+
+    def withdraw(self, value):
+        value = self._currency.to_units(value)
+        if value <= 0:
+            raise ValueError('Withdrawal value must be positive.')
+        with self._lock:
+            if value > self._balance and not self._is_overdraft_allowed:
+                overdraft = Money._make(self._balance - value, self._currency)
+                raise OverdraftNotAllowed(f'Would result in overdraft of {overdraft}')
+            self._debit(value)
+
+    def _debit(self, value):
+        # validated units; the caller holds the lock
+        old_balance = self._balance
+        self._balance -= value
+        entry = self._make_ledger_entry(-value, self._balance)
+        if self._listeners:
+            self._notify(old_balance, (entry,))
+
+    def try_withdraw(self, value):
+        '''Withdraw value if allowed, without raising: returns a WithdrawStatus.
+
+        Rejections allocate no exception and format no message, which
+        makes this the cheap path when most attempts are expected to fail.
+        '''
+        try:
+            value = self._currency.to_units(value)
+        except (TypeError, ValueError):
+            return WithdrawStatus.INVALID
+        if value <= 0:
+            return WithdrawStatus.INVALID
+        with self._lock:
+            if value > self._balance and not self._is_overdraft_allowed:
+                return WithdrawStatus.OVERDRAFT
+            self._debit(value)
+        return WithdrawStatus.OK
+
+    def can_withdraw(self, value):
+        '''Whether withdraw(value) would succeed right now; nothing is changed.'''
+        try:
+            value = self._currency.to_units(value)
+        except (TypeError, ValueError):
+            return False
+        return value > 0 and (self._is_overdraft_allowed or value <= self._balance)
+
+    def can_withdraw_many(self, values):
+        '''can_withdraw() for each candidate amount, against the current balance.
+
+        Each amount is checked on its own, not cumulatively; returns a list
+        of bools (a mask over values).
+        '''
+        to_units = self._currency.to_units
+        units = []
+        for value in values:
+            try:
+                units.append(to_units(value))
+            except (TypeError, ValueError):
+                units.append(0)  # invalid, so never withdrawable
+        if self._is_overdraft_allowed:
+            return [value > 0 for value in units]
+        balance = self._balance
+        return [0 < value <= balance for value in units]
+
+    def apply_batch(self, amounts):
+        '''Apply many signed transactions (deposits > 0, withdrawals < 0) at once.
+
+        The whole batch is validated before anything is applied: if any
+        transaction fails, the account is left unchanged.
+        '''
+        to_units = self._currency.to_units
+        amounts = [to_units(amount) for amount in amounts]
+        bad = next((i for i, value in enumerate(amounts) if value == 0), None)
+        if bad is not None:
+            raise ValueError(f'Transaction {bad}: value must be non-zero.')
+        self._apply_units(amounts)
+
+    def _apply_units(self, amounts):
+        if not amounts:
+            return
+        with self._lock:
+            balances = list(accumulate(amounts, initial=self._balance))[1:]
+            if not self._is_overdraft_allowed:
+                bad = next(
+                    (i for i, (value, balance) in enumerate(zip(amounts, balances))
+                     if value < 0 and balance < 0),
+                    None
+                )
+                if bad is not None:
+                    overdraft = Money._make(balances[bad], self._currency)
+                    raise BatchOverdraftNotAllowed(
+                        f'Transaction {bad}: would result in overdraft of {overdraft}',
+                        bad
+                    )
+            self._post_units(amounts, balances)
+
+    def _post_units(self, amounts, balances):
+        # already validated; the caller holds the lock
+        old_balance = self._balance
+        self._balance = balances[-1]
+        entries = self._make_ledger_entries(amounts, balances)
+        if self._listeners:
+            self._notify(old_balance, entries)
+
+    def deposit_many(self, values):
+        to_units = self._currency.to_units
+        values = [to_units(value) for value in values]
+        bad = next((i for i, value in enumerate(values) if value <= 0), None)
+        if bad is not None:
+            raise ValueError(f'Deposit {bad}: value must be positive')
+        self._apply_units(values)
+
+    def withdraw_many(self, values):
+        to_units = self._currency.to_units
+        values = [to_units(value) for value in values]
+        bad = next((i for i, value in enumerate(values) if value <= 0), None)
+        if bad is not None:
+            raise ValueError(f'Withdrawal {bad}: value must be positive.')
+        self._apply_units([-value for value in values])
+
+    def __repr__(self):
+        return (
+            f'({self.account_number}) {self.last_name}, '
+            f'balance: {self.balance}, '
+            f'overdraft: {self.is_overdraft_allowed}, '
+            f'# transaction: {len(self._ledger)}'
+        )
+
+    def __str__(self):
+        return f'{self.account_number}: {self.balance}'
+
+    def __eq__(self, other):
+        return isinstance(other, Account) and self.account_number == other.account_number
+
+    def __hash__(self):
+        # must agree with __eq__, which only looks at the account number
+        return hash(self._account_number)
+
+
+_change_groups = local()
+
+
+class ChangeGroup:
+    '''The listener notifications of one multi-account operation.
+
+    transfer() and settle() open a group, with every involved account
+    locked, around their ledger writes. A listener that needs to see such
+    an operation as a whole (e.g. to log it atomically) can defer() what
+    it is notified of; its callback then gets all of it at once when the
+    group closes, before the locks are released.
+    '''
+    __slots__ = ('_deferred', '_previous')
+
+    def __init__(self):
+        self._deferred = {}
+
+    def defer(self, key, callback, item):
+        '''Collect item under key; callback(items) is called once, with the
+        items in order, when the group closes.'''
+        deferred = self._deferred.get(key)
+        if deferred is None:
+            deferred = self._deferred[key] = (callback, [])
+        deferred[1].append(item)
+
+    def __enter__(self):
+        self._previous = getattr(_change_groups, 'current', None)
+        if self._previous is not None:
+            return self._previous  # nested: the outer operation is the unit
+        _change_groups.current = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._previous is not None:
+            return
+        _change_groups.current = None
+        # even after an error: whatever was applied must still be reported
+        for callback, items in self._deferred.values():
+            callback(items)
+
+
+def current_change_group():
+    '''The ChangeGroup open on this thread, or None.'''
+    return getattr(_change_groups, 'current', None)
+
+
+def transfer(src, dst, amount):
+    '''Move amount from src to dst as one atomic operation.
+
+    Both accounts' locks are held for the duration, always acquired in the
+    same (id-based) order so that concurrent transfers in opposite
+    directions cannot deadlock.
+    '''
+    if src is dst:
+        raise ValueError('Cannot transfer to the same account.')
+    if src.currency is not dst.currency:
+        raise ValueError(f'Cannot transfer {src.currency.code} to {dst.currency.code}.')
+    amount = Money(amount, src.currency)
+    if amount <= 0:
+        raise ValueError('Transfer value must be positive.')
+    first, second = sorted((src, dst), key=id)
+    with first._lock, second._lock, ChangeGroup():
+        src.withdraw(amount)
+        dst.deposit(amount)
+
+
+def settle(transfers, itemised=False):
+    '''Apply a batch of (src, dst, amount) transfers atomically, netted per account.
+
+    The transfers are summed into one net movement per account, every
+    resulting balance is checked against its account's overdraft setting,
+    and only then is anything written: each account whose balance changes
+    gets a single ledger entry for the batch. With itemised=True each
+    account instead gets one entry per transfer leg, in batch order; only
+    the final balances are checked, so a leg may pass through a negative
+    balance that the rest of the batch covers.
+
+    All involved accounts are locked (in the same id-based order as
+    transfer()) for the duration. If any transfer is invalid or any
+    balance would be overdrawn, nothing is applied. Returns a dict mapping
+    each involved account to its net change as Money.
+    '''
+    net = {}
+    legs = defaultdict(list) if itemised else None
+    currency = None
+    for i, (src, dst, amount) in enumerate(transfers):
+        if src is dst:
+            raise ValueError(f'Transfer {i}: cannot transfer to the same account.')
+        if currency is None:
+            currency = src.currency
+        if src.currency is not currency or dst.currency is not currency:
+            raise ValueError(f'Transfer {i}: all accounts must be in {currency.code}.')
+        units = currency.to_units(amount)
+        if units <= 0:
+            raise ValueError(f'Transfer {i}: value must be positive.')
+        net[src] = net.get(src, 0) - units
+        net[dst] = net.get(dst, 0) + units
+        if itemised:
+            legs[src].append(-units)
+            legs[dst].append(units)
+
+    with ExitStack() as stack:
+        for account in sorted(net, key=id):
+            stack.enter_context(account._lock)
+        overdrawn = [
+            account for account, units in net.items()
+            if units < 0 and account._balance + units < 0
+            and not account._is_overdraft_allowed
+        ]
+        if overdrawn:
+            raise OverdraftNotAllowed('Would result in overdraft of ' + ', '.join(
+                f'{Money._make(account._balance + net[account], currency)} '
+                f'on account {account.account_number}'
+                for account in overdrawn
+            ))
+        stack.enter_context(ChangeGroup())
+        for account, units in net.items():
+            amounts = legs[account] if itemised else [units]
+            if units or itemised:
+                balances = list(accumulate(amounts, initial=account._balance))[1:]
+                account._post_units(amounts, balances)
+    return {account: Money._make(units, currency) for account, units in net.items()}
+
+
+class _SortedKeys:
+    '''Sorted list of keys held as a list of sorted chunks.
+
+    add() and remove() bisect to the right chunk and then touch only that
+    chunk, so they cost O(log n + chunk size) instead of the O(n) shift of
+    a single sorted list.
+    '''
+    __slots__ = ('_chunks', '_maxes')
+
+    _LOAD = 512  # chunks are split above twice this, merged below half
+
+    def __init__(self):
+        self._chunks = []
+        self._maxes = []  # last key of each chunk
+
+    def __len__(self):
+        return sum(map(len, self._chunks))
+
+    def add(self, key):
+        maxes = self._maxes
+        if not maxes:
+            self._chunks.append([key])
+            maxes.append(key)
+            return
+        i = bisect_left(maxes, key)
+        if i == len(maxes):
+            i -= 1
+            self._chunks[i].append(key)
+            maxes[i] = key
+        else:
+            insort(self._chunks[i], key)
+        if len(self._chunks[i]) > 2 * self._LOAD:
+            self._rebalance(i)
+
+    def remove(self, key):
+        maxes = self._maxes
+        i = bisect_left(maxes, key)
+        chunk = self._chunks[i] if i < len(maxes) else ()
+        j = bisect_left(chunk, key)
+        if j == len(chunk) or chunk[j] != key:
+            raise KeyError(key)
+        del chunk[j]
+        if chunk:
+            maxes[i] = chunk[-1]
+            if len(chunk) < self._LOAD // 2 and len(maxes) > 1:
+                self._rebalance(i)
+        else:
+            del self._chunks[i]
+            del maxes[i]
+
+    def _rebalance(self, i):
+        # merge chunk i with a neighbour, then split the result if too long
+        chunks = self._chunks
+        if len(chunks[i]) < self._LOAD // 2:
+            i = max(i - 1, 0)
+            chunks[i:i + 2] = [chunks[i] + chunks[i + 1]]
+        chunk = chunks[i]
+        if len(chunk) > 2 * self._LOAD:
+            chunks[i:i + 1] = [chunk[:self._LOAD], chunk[self._LOAD:]]
+        self._maxes = [chunk[-1] for chunk in chunks]
+
+    def irange(self, low=None, high=None):
+        '''Keys with low <= key < high in order (either bound may be None).'''
+        chunks, maxes = self._chunks, self._maxes
+        i = 0 if low is None else bisect_left(maxes, low)
+        for chunk in islice(chunks, i, None):
+            start = 0 if low is None else bisect_left(chunk, low)
+            low = None
+            if high is not None and chunk[-1] >= high:
+                yield from islice(chunk, start, bisect_left(chunk, high))
+                return
+            yield from islice(chunk, start, None)
+
+
+class _BalanceIndex:
+    '''Account numbers by balance in minor units, for one currency.
+
+    Accounts with the same balance share a set; only balances that appear
+    or disappear touch the sorted keys.
+    '''
+    __slots__ = ('_holders', '_units')
+
+    def __init__(self):
+        self._holders = {}  # units -> set of account numbers
+        self._units = _SortedKeys()
+
+    def add(self, units, number):
+        holders = self._holders.get(units)
+        if holders is None:
+            holders = self._holders[units] = set()
+            self._units.add(units)
+        holders.add(number)
+
+    def remove(self, units, number):
+        holders = self._holders[units]
+        holders.remove(number)
+        if not holders:
+            del self._holders[units]
+            self._units.remove(units)
+
+    def irange(self, low=None, high=None):
+        '''(units, account_number) with low <= units < high, in order.'''
+        holders = self._holders
+        for units in self._units.irange(low, high):
+            for number in sorted(holders[units]):
+                yield units, number
+
+
+def _bound_units(bound, currency):
+    # the least number of minor units >= bound, so that low <= balance and
+    # balance < high hold for units exactly when they do for the amounts
+    if isinstance(bound, Money):
+        bound = bound._fraction()
+    return math.ceil(Fraction(bound) * currency._factor)
+
+
+class AccountRegistry:
+    '''Container of accounts indexed by account_number.
+
+    Lookups by account number are O(1). Secondary indexes on last_name and
+    on balance (kept sorted per currency, and updated as accounts change)
+    answer queries such as "all overdrawn accounts" without scanning every
+    account.
+    '''
+    def __init__(self, accounts=()):
+        self._accounts = {}
+        self._by_last_name = defaultdict(set)
+        self._by_balance = {}  # currency -> _BalanceIndex
+        # accounts may notify us from several threads at once
+        self._lock = Lock()
+        for account in accounts:
+            self.add(account)
+
+    def add(self, account):
+        # the account's lock first, then ours, as in _balance_changed(): the
+        # balance read and the listener registration must not straddle a
+        # concurrent change
+        with account._lock, self._lock:
+            if account.account_number in self._accounts:
+                raise ValueError(f'Duplicate account number {account.account_number}.')
+            self._accounts[account.account_number] = account
+            self._by_last_name[account.last_name].add(account.account_number)
+            index = self._by_balance.get(account.currency)
+            if index is None:
+                index = self._by_balance[account.currency] = _BalanceIndex()
+            index.add(account._balance, account.account_number)
+            account.add_listener(self._balance_changed)
+
+    def remove(self, account_number):
+        account = self._accounts[account_number]
+        with account._lock, self._lock:
+            if self._accounts.get(account_number) is not account:
+                raise KeyError(account_number)
+            account.remove_listener(self._balance_changed)
+            del self._accounts[account_number]
+            numbers = self._by_last_name[account.last_name]
+            numbers.discard(account_number)
+            if not numbers:
+                del self._by_last_name[account.last_name]
+            self._by_balance[account.currency].remove(account._balance, account_number)
+        return account
+
+    def _balance_changed(self, account, old_balance, entries):
+        number = account.account_number
+        with self._lock:
+            index = self._by_balance[account.currency]
+            index.remove(old_balance.units, number)
+            index.add(account._balance, number)
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __iter__(self):
+        return iter(self._accounts.values())
+
+    def __contains__(self, account_number):
+        return account_number in self._accounts
+
+    def __getitem__(self, account_number):
+        return self._accounts[account_number]
+
+    def get(self, account_number, default=None):
+        return self._accounts.get(account_number, default)
+
+    def by_last_name(self, last_name):
+        return [self._accounts[n] for n in self._by_last_name.get(last_name, ())]
+
+    def by_balance(self, low=None, high=None):
+        '''Accounts with low <= balance < high (either bound may be None),
+        in order of balance.'''
+        with self._lock:
+            ranges = [
+                (currency, index.irange(
+                    None if low is None else _bound_units(low, currency),
+                    None if high is None else _bound_units(high, currency),
+                ))
+                for currency, index in self._by_balance.items()
+            ]
+            if len(ranges) == 1:
+                keys = ranges[0][1]
+            else:
+                # balances in different currencies are ordered by amount
+                keys = sorted(
+                    (Fraction(units, currency._factor), number)
+                    for currency, keys in ranges for units, number in keys
+                )
+            return [self._accounts[n] for _, n in keys]
+
+    def overdrawn(self):
+        return self.by_balance(high=0)
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from account_wal import LOG_NAME, WriteAheadLog
+from solutions import Account, FrozenClock, settle, transfer
+
+
+class WriteAheadLogTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.directory = self._dir.name
+        self.log_path = os.path.join(self.directory, LOG_NAME)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _balances(self):
+        return {
+            number: str(account.balance)
+            for number, account in WriteAheadLog.recover(self.directory).items()
+        }
+
+    def test_deposit_is_durable_when_it_returns(self):
+        wal = WriteAheadLog(self.directory, max_delay=0.05)
+        acct = Account('John', 'Smith', '1', 100)
+        wal.attach(acct)
+        acct.deposit(5)
+        self.assertEqual(self._balances(), {'1': '105.00'})
+        wal.close()
+
+    def test_reopen_after_torn_write(self):
+        with WriteAheadLog(self.directory) as wal:
+            acct = Account('John', 'Smith', '1', 100)
+            wal.attach(acct)
+            acct.deposit(5)
+        size = os.path.getsize(self.log_path)
+        with open(self.log_path, 'ab') as f:
+            f.write(b'{"k":"c","e":[["1",2,')  # a record cut short by a crash
+        self.assertEqual(self._balances(), {'1': '105.00'})
+
+        acct = WriteAheadLog.recover(self.directory)['1']
+        with WriteAheadLog(self.directory) as wal:
+            self.assertEqual(os.path.getsize(self.log_path), size)
+            wal.attach(acct)
+            acct.deposit(1)
+        self.assertEqual(self._balances(), {'1': '106.00'})
+
+    def test_damaged_line_is_skipped(self):
+        with WriteAheadLog(self.directory) as wal:
+            acct = Account('John', 'Smith', '1', 100)
+            wal.attach(acct)
+            acct.deposit(5)
+        with open(self.log_path, 'ab') as f:
+            f.write(b'{"k":"c","e":[["1",2,\n')
+        self.assertEqual(self._balances(), {'1': '105.00'})
+
+    def test_snapshot_keeps_ledger_time_order(self):
+        start = datetime(2021, 1, 1)
+        clock = FrozenClock(start, step=timedelta(seconds=1))
+        with WriteAheadLog(self.directory) as wal:
+            acct = Account('John', 'Smith', '1', 100, clock=clock)
+            wal.attach(acct)
+            acct.deposit(5)
+            wal.snapshot()
+            acct.deposit(7)
+        recovered = WriteAheadLog.recover(self.directory)['1']
+        stamps = [entry.ns for entry in recovered.ledger]
+        self.assertEqual(stamps, sorted(stamps))
+        self.assertEqual(str(recovered.balance_at(start + timedelta(seconds=1))), '105.00')
+        self.assertEqual(str(recovered.balance), '112.00')
+
+    def _crash_mid_last_record(self):
+        with open(self.log_path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.log_path) - 5)
+
+    def test_transfer_is_recovered_whole_or_not_at_all(self):
+        with WriteAheadLog(self.directory) as wal:
+            src = Account('John', 'Smith', '1', 100, thread_safe=True)
+            dst = Account('Jane', 'Doe', '2', 0, thread_safe=True)
+            wal.attach(src)
+            wal.attach(dst)
+            before = os.path.getsize(self.log_path)
+            transfer(src, dst, 30)
+            with open(self.log_path, 'rb') as f:
+                f.seek(before)
+                self.assertEqual(len(f.read().splitlines()), 1)
+        self.assertEqual(self._balances(), {'1': '70.00', '2': '30.00'})
+        self._crash_mid_last_record()
+        self.assertEqual(self._balances(), {'1': '100.00', '2': '0.00'})
+
+    def test_settle_is_recovered_whole_or_not_at_all(self):
+        with WriteAheadLog(self.directory) as wal:
+            accounts = [Account('f', 'l', str(i), 100) for i in range(3)]
+            for acct in accounts:
+                wal.attach(acct)
+            a, b, c = accounts
+            settle([(a, b, 10), (b, c, 25), (c, a, 5)], itemised=True)
+        self.assertEqual(
+            self._balances(), {'0': '95.00', '1': '85.00', '2': '120.00'}
+        )
+        self._crash_mid_last_record()
+        self.assertEqual(
+            self._balances(), {'0': '100.00', '1': '100.00', '2': '100.00'}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import gzip
+import unittest
+
+try:
+    from exercise02 import (
+        TitleScanner, extract_title, fetch_title, header_charset, sample_page, serve
+    )
+except ImportError:  # exercise02 needs requests
+    TitleScanner = None
+
+
+PAGE = (
+    b'<!DOCTYPE html>\n<html><head><meta charset="UTF-8">\n'
+    b'<title>John von Neumann - Wikipedia</title>\n</head><body></body></html>\n'
+)
+
+
+@unittest.skipIf(TitleScanner is None, 'requests is not installed')
+class TitleScannerTest(unittest.TestCase):
+    def _scan(self, data, chunk_size, encoding=None):
+        scanner = TitleScanner()
+        for i in range(0, len(data), chunk_size):
+            if scanner.feed(data[i:i + chunk_size]):
+                break
+        return scanner.title(encoding)
+
+    def test_tags_split_across_chunks(self):
+        for chunk_size in range(1, len(PAGE) + 1):
+            self.assertEqual(
+                self._scan(PAGE, chunk_size), 'John von Neumann - Wikipedia', chunk_size
+            )
+
+    def test_every_split_point(self):
+        for cut in range(1, len(PAGE)):
+            scanner = TitleScanner()
+            scanner.feed(PAGE[:cut])
+            scanner.feed(memoryview(PAGE)[cut:])
+            self.assertEqual(scanner.title(), 'John von Neumann - Wikipedia', cut)
+
+    def test_attributes_and_case(self):
+        data = b'<html><HEAD><TITLE lang="en" dir=ltr>Mixed</Title >'
+        self.assertEqual(self._scan(data, 3), 'Mixed')
+        # <titles> is not a title tag
+        self.assertIsNone(extract_title(b'<titles>no</titles>'))
+
+    def test_entities_and_whitespace(self):
+        data = b'<title>\n  Fish &amp; Chips\t&#8211; menu \n</title>'
+        self.assertEqual(extract_title(data), 'Fish & Chips – menu')
+
+    def test_missing_title(self):
+        scanner = TitleScanner()
+        self.assertFalse(scanner.feed(b'<html><head></head><body>'))
+        self.assertIsNone(scanner.title())
+
+    def test_meta_charset(self):
+        title = 'Джон'  # Cyrillic
+        data = (
+            b'<head><meta http-equiv="Content-Type" content="text/html; charset=windows-1251">'
+            b'<title>' + title.encode('cp1251') + b'</title>'
+        )
+        self.assertEqual(self._scan(data, 7), title)
+        scanner = TitleScanner()
+        scanner.feed(data)
+        self.assertEqual(scanner.meta_charset, 'windows-1251')
+
+    def test_header_charset_wins_over_meta(self):
+        data = b'<meta charset="utf-8"><title>caf\xe9</title>'
+        self.assertEqual(extract_title(data, 'iso-8859-1'), 'caf\xe9')
+        # unknown charsets fall back to UTF-8
+        self.assertEqual(extract_title(b'<title>ok</title>', 'no-such-codec'), 'ok')
+
+    def test_byte_order_mark_wins(self):
+        data = b'\xef\xbb\xbf<title>caf\xc3\xa9</title>'
+        self.assertEqual(self._scan(data, 1, 'iso-8859-1'), 'caf\xe9')
+
+    def test_header_charset(self):
+        self.assertEqual(header_charset('text/html; charset="UTF-8"'), 'UTF-8')
+        self.assertEqual(header_charset('text/html;charset=windows-1252'), 'windows-1252')
+        self.assertIsNone(header_charset('text/html'))
+        self.assertIsNone(header_charset(None))
+
+
+@unittest.skipIf(TitleScanner is None, 'requests is not installed')
+class FetchTitleTest(unittest.TestCase):
+    TITLE = 'John von Neumann - Wikipedia'
+
+    def setUp(self):
+        self.body = sample_page(self.TITLE)
+
+    def _fetch(self, compress, **kwargs):
+        with serve({'/wiki/John_von_Neumann': self.body}, compress=compress) as base:
+            return fetch_title(base + '/wiki/John_von_Neumann', **kwargs)
+
+    def test_stops_early(self):
+        result = self._fetch(False)
+        self.assertEqual(result.title, self.TITLE)
+        self.assertEqual(result.page_size, len(self.body))
+        self.assertLess(result.bytes_read, result.page_size)
+
+    def test_stops_early_gzip(self):
+        result = self._fetch(True)
+        self.assertEqual(result.title, self.TITLE)
+        # sizes are of the compressed body, as sent
+        self.assertEqual(result.page_size, len(gzip.compress(self.body)))
+        self.assertLess(result.bytes_read, result.page_size)
+
+    def test_drain_reads_the_rest(self):
+        for compress in (False, True):
+            result = self._fetch(compress, drain=len(self.body))
+            self.assertEqual(result.title, self.TITLE)
+            self.assertEqual(result.bytes_read, result.page_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
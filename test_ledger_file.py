@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+from ledger_file import FileLedger, _HEADER, _RECORD
+from ledger_io import read_columns, read_csv, write_columns, write_csv
+from solutions import Account, FrozenClock
+
+
+class FileLedgerReopenTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'acct.ledger')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _account(self, ledger, balance=None):
+        return Account('John', 'Smith', '1', balance, ledger_storage=ledger, clock=FrozenClock(7))
+
+    def test_reopen_after_torn_write(self):
+        with FileLedger(self.path) as ledger:
+            acct = self._account(ledger, 100)
+            acct.deposit(5)
+            expected = list(ledger)
+        with open(self.path, 'ab') as f:
+            f.write(b'\x01' * 10)  # a record cut short by a crash
+
+        with FileLedger(self.path) as ledger:
+            self.assertEqual(len(ledger), 2)
+            self.assertEqual(os.path.getsize(self.path), _HEADER.size + 2 * _RECORD.size)
+            self.assertEqual(list(ledger), expected)
+            acct = self._account(ledger)
+            acct.deposit(1)
+            entries = list(ledger)
+        self.assertEqual(entries[:2], expected)
+        self.assertEqual(
+            (entries[2].ns, entries[2].units, entries[2].balance_units), (7, 100, 10600)
+        )
+
+        with FileLedger(self.path) as ledger:
+            self.assertEqual(list(ledger), entries)
+
+    def test_short_header_rejected(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'LEDG')
+        with self.assertRaisesRegex(ValueError, 'not a ledger file'):
+            FileLedger(self.path)
+
+
+class FileLedgerImportTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.dir = self._dir.name
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _check_import(self, write, read, name):
+        accounts = [
+            Account('John', 'Smith', '1', 100, clock=FrozenClock(1)),
+            Account('Jane', 'Doe', '2', 5, currency='JPY', clock=FrozenClock(2)),
+        ]
+        accounts[0].deposit(3)
+        path = os.path.join(self.dir, name)
+        write(accounts, path)
+        for source, acct in zip(accounts, read(path, FileLedger.factory(self.dir))):
+            with acct._ledger as ledger:
+                self.assertIsInstance(ledger, FileLedger)
+                self.assertEqual(
+                    ledger.path, os.path.join(self.dir, f'{source.account_number}.ledger')
+                )
+                self.assertEqual(list(ledger), list(source.ledger))
+                self.assertEqual(acct.balance, source.balance)
+
+    def test_read_columns_into_file_ledgers(self):
+        self._check_import(write_columns, read_columns, 'ledgers.bin')
+
+    def test_read_csv_into_file_ledgers(self):
+        self._check_import(write_csv, read_csv, 'ledgers.csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
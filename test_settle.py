@@ -0,0 +1,67 @@
+import unittest
+
+from solutions import Account, FrozenClock, Money, OverdraftNotAllowed, settle
+
+
+class SettleTest(unittest.TestCase):
+    def setUp(self):
+        clock = FrozenClock(1)
+        self.a = Account('A', 'A', '1', 100, clock=clock)
+        self.b = Account('B', 'B', '2', 0, clock=clock)
+        self.c = Account('C', 'C', '3', 50, clock=clock)
+        self.accounts = (self.a, self.b, self.c)
+
+    def _state(self):
+        return [(acct.balance, list(acct.ledger)) for acct in self.accounts]
+
+    def test_nets_one_entry_per_account(self):
+        result = settle([(self.a, self.b, 30), (self.b, self.c, 10), (self.c, self.a, 5)])
+        self.assertEqual(result, {
+            self.a: Money('-25', 'USD'), self.b: Money('20', 'USD'), self.c: Money('5', 'USD'),
+        })
+        self.assertEqual(
+            [acct.balance for acct in self.accounts],
+            [Money('75', 'USD'), Money('20', 'USD'), Money('55', 'USD')],
+        )
+        self.assertEqual([len(acct.ledger) for acct in self.accounts], [2, 2, 2])
+
+    def test_zero_net_gets_no_entry(self):
+        settle([(self.a, self.b, 10), (self.b, self.a, 10)])
+        self.assertEqual([len(acct.ledger) for acct in self.accounts], [1, 1, 1])
+
+    def test_overdraft_applies_nothing(self):
+        before = self._state()
+        with self.assertRaisesRegex(OverdraftNotAllowed, 'account 2'):
+            settle([(self.a, self.c, 10), (self.b, self.c, 1)])
+        self.assertEqual(self._state(), before)
+
+    def test_invalid_transfer_applies_nothing(self):
+        before = self._state()
+        jpy = Account('J', 'J', '4', 100, currency='JPY')
+        for transfers in (
+            [(self.a, self.b, 10), (self.c, self.c, 1)],
+            [(self.a, self.b, 10), (self.c, self.b, 0)],
+            [(self.a, self.b, 10), (self.c, jpy, 1)],
+        ):
+            with self.assertRaises(ValueError):
+                settle(transfers)
+            self.assertEqual(self._state(), before)
+
+    def test_overdraft_allowed(self):
+        self.b.is_overdraft_allowed = True
+        settle([(self.b, self.a, 30)])
+        self.assertEqual(self.b.balance, Money('-30', 'USD'))
+
+    def test_itemised_legs_in_order(self):
+        # b passes through -10 but ends at 0, so the batch is allowed
+        settle([(self.b, self.c, 10), (self.a, self.b, 10)], itemised=True)
+        self.assertEqual(
+            [(entry.units, entry.balance_units) for entry in self.b.ledger[1:]],
+            [(-1000, -1000), (1000, 0)],
+        )
+        self.assertEqual(len(self.a.ledger), 2)
+        self.assertEqual(self.c.balance, Money('60', 'USD'))
+
+
+if __name__ == '__main__':
+    unittest.main()